@@ -0,0 +1,104 @@
+import time
+from collections import namedtuple
+
+import mqtt_init
+
+
+# kind is 'raised' or 'cleared'; source is the room name (or the topic for unrouted messages)
+AlarmEvent = namedtuple('AlarmEvent', 'kind source sensor value threshold text')
+
+DEFAULT_THRESHOLDS = {
+    'temperature': 50.0,
+    'humidity': 80.0,
+    'lux': 1000.0,
+    'gas_weight': mqtt_init.gas_weight_THR,
+}
+
+# how far a value has to fall back below the threshold before the alarm clears
+DEFAULT_HYSTERESIS = {
+    'temperature': 1.0,
+    'humidity': 3.0,
+    'lux': 50.0,
+    'gas_weight': 50.0,
+}
+
+ALARM_LABELS = {
+    'temperature': 'Temperature high',
+    'humidity': 'Humidity high',
+    'lux': 'Light (lux) high',
+    'gas_weight': 'Gas weight alarm',
+}
+
+
+class AlarmEngine:
+    """Tracks alarm state per (source, sensor).
+
+    An alarm is raised when a value reaches its threshold and stays active,
+    without further events, until the value drops below threshold minus the
+    hysteresis band. A source/sensor that keeps flapping is raised again at
+    most once per `cooldown` seconds. With `hold` > 0 an alarm is only raised
+    once every reading of the last `hold` seconds in `recent` (a
+    recent_history.RecentHistory already fed with the current reading) was
+    at or above the threshold. Not thread-safe: call it from one thread
+    (IngestService uses the MQTT network thread)."""
+
+    def __init__(self, thresholds=None, hysteresis=None, cooldown=60.0, clock=time.monotonic,
+                 hold=0.0, recent=None):
+        if hold and recent is None:
+            raise ValueError('hold needs the recent readings to look back at')
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.hysteresis = dict(DEFAULT_HYSTERESIS if hysteresis is None else hysteresis)
+        self.cooldown = cooldown
+        self.clock = clock
+        self.hold = hold
+        self.recent = recent
+        self._active = {}       # (source, sensor) -> whether its raise was announced
+        self._last_raised = {}  # (source, sensor) -> clock() of the last raise event
+
+    def update(self, source, sensor, value):
+        """Feed one reading; returns an AlarmEvent on a state change, else None."""
+        threshold = self.thresholds.get(sensor)
+        if threshold is None:
+            return None
+        key = (source, sensor)
+        label = ALARM_LABELS.get(sensor, sensor)
+        if key in self._active:
+            if value < threshold - self.hysteresis.get(sensor, 0.0):
+                announced = self._active.pop(key)
+                if not announced:
+                    return None
+                return AlarmEvent('cleared', source, sensor, value, threshold,
+                                  f'{label} cleared: {value} ({source})')
+            if self._active[key] or self.clock() - self._last_raised[key] < self.cooldown:
+                return None
+            # still high after a silenced re-raise: announce it once the cooldown is over
+            return self._raise(key, label, source, sensor, value, threshold)
+
+        if value < threshold:
+            return None
+        if self.hold and not self._held(source, sensor, threshold):
+            # not high for long enough yet, checked again with the next reading
+            return None
+        now = self.clock()
+        last = self._last_raised.get(key)
+        if last is not None and now - last < self.cooldown:
+            # re-raised inside the cooldown: tracked as active but not announced again
+            self._active[key] = False
+            return None
+        return self._raise(key, label, source, sensor, value, threshold)
+
+    def _held(self, source, sensor, threshold):
+        # the reading just before the window counts too: the value has been
+        # high since then, and without one the series is too short to tell
+        cutoff = int((time.time() - self.hold) * 1000)
+        ts, values = self.recent.window(source, sensor, since_ms=cutoff, previous=True)
+        return len(ts) > 0 and ts[0] <= cutoff and min(values) >= threshold
+
+    def _raise(self, key, label, source, sensor, value, threshold):
+        self._active[key] = True
+        self._last_raised[key] = self.clock()
+        return AlarmEvent('raised', source, sensor, value, threshold, f'{label}: {value} ({source})')
+
+    def active(self):
+        """(source, sensor) pairs currently in alarm."""
+        return list(self._active)
@@ -0,0 +1,245 @@
+"""End-to-end ingest benchmark: subscribe -> parse -> route -> persist -> alarm.
+
+Starts benchmarks/mini_broker.py on a free localhost port and a publisher
+process, then runs the real IngestService against them, so no internet or
+external broker is needed:
+    python benchmarks/bench_ingest.py [--messages 50000] [--rate 0] [--out result.json]
+--direct skips the broker and calls IngestService.handle_message from a
+thread, which measures the processing cost alone. Latency is publish ->
+handled (listeners called), DB rows/s counts until the writer has flushed.
+Results are printed and written as JSON; --compare old.json prints the
+change against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# (result key, label) of the numbers shown by --compare
+COMPARED = [
+    ('throughput_msg_s', 'throughput msg/s'),
+    ('latency_p50_ms', 'latency p50 ms'),
+    ('latency_p99_ms', 'latency p99 ms'),
+    ('db_rows_per_s', 'DB rows/s'),
+    ('peak_rss_mb', 'peak RSS MB'),
+]
+
+
+def make_payloads(args):
+    """Endless (topic, JSON payload) cycle over the simulated sensors, stamped with the send time."""
+    from load_generator import build_streams
+    streams = build_streams(args.rooms, args.sensors, args.combined)
+    while True:
+        for topic, read in streams:
+            values = read()
+            values['sent'] = time.time()
+            yield topic, json.dumps(values)
+
+
+def paced(count, rate):
+    """Yields count times, spread evenly at `rate` per second (0 = as fast as possible)."""
+    t0 = time.perf_counter()
+    for k in range(count):
+        if rate:
+            delay = t0 + k / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield k
+
+
+def run_publisher(args):
+    # runs in its own process so it doesn't compete with the ingest side for the GIL
+    import paho.mqtt.client as mqtt
+    client = mqtt.Client('bench_publisher', clean_session=True)
+    client.connect('127.0.0.1', args.port)
+    client.loop_start()
+    source = make_payloads(args)
+    for _ in paced(args.messages, args.rate):
+        client.publish(*next(source))
+    client.disconnect()
+    client.loop_stop()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def start_broker():
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, 'mini_broker.py'), '--port', '0'],
+                            stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith('listening on'):
+        proc.kill()
+        raise RuntimeError('mini broker did not start')
+    return proc, int(line.split()[-1])
+
+
+def run(args):
+    broker_proc = publisher = None
+    if not args.direct:
+        broker_proc, port = start_broker()
+        # broker_config reads these when ingest_service is first imported
+        os.environ['MQTT_HOST'] = '127.0.0.1'
+        os.environ['MQTT_PORT'] = str(port)
+    import ingest_service
+    import mqtt_init
+    if not args.verbose:
+        # mqtt_init logs every connect and alarm publish through icecream
+        mqtt_init.ic.disable()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, 'bench.db')
+    log = print if args.verbose else (lambda text: None)
+    service = ingest_service.IngestService(db_path, client_name='Bench-', log=log)
+
+    latencies = array('d')
+    received = array('d')  # receive times, for throughput
+    done = threading.Event()
+
+    def on_message(msg):
+        sent = msg.data.get('sent') if msg.data else None
+        if sent is None:
+            return  # e.g. alarms the service published itself
+        now = time.time()
+        latencies.append(now - sent)
+        received.append(now)
+        if len(latencies) >= args.messages:
+            done.set()
+    service.listeners.append(on_message)
+
+    try:
+        service.start()
+        if args.direct:
+            def feed():
+                source = make_payloads(args)
+                for _ in paced(args.messages, args.rate):
+                    service.handle_message(*next(source))
+            threading.Thread(target=feed, daemon=True).start()
+        else:
+            connected = threading.Event()
+
+            def on_status(ok, text):
+                if ok:
+                    connected.set()
+            service.status_listeners.append(on_status)
+            service.connect()
+            if not connected.wait(10):
+                raise RuntimeError('ingest service could not connect to the mini broker')
+            publisher = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--publisher',
+                                          '--port', str(port), '--messages', str(args.messages),
+                                          '--rate', str(args.rate), '--rooms', str(args.rooms),
+                                          '--sensors', str(args.sensors)] + (['--combined'] if args.combined else []))
+            publisher.wait()
+        done.wait(args.timeout)
+
+        service.writer.flush(timeout=args.timeout)
+        flushed = time.time()
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT COUNT(*) FROM readings').fetchone()[0]
+        conn.close()
+    finally:
+        service.stop()
+        if publisher and publisher.poll() is None:
+            publisher.kill()
+        if broker_proc:
+            broker_proc.terminate()
+            broker_proc.wait()
+        tmp.cleanup()
+
+    n = len(latencies)
+    lat = sorted(latencies)
+    span = received[-1] - received[0] if n > 1 else 0.0
+    return {
+        'benchmark': 'ingest',
+        'mode': 'direct' if args.direct else 'broker',
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'messages': args.messages,
+        'target_rate': args.rate,
+        'rooms': args.rooms,
+        'sensors': args.sensors,
+        'combined': args.combined,
+        'received': n,
+        'lost': args.messages - n,
+        'throughput_msg_s': (n - 1) / span if span > 0 else None,
+        'latency_p50_ms': percentile(lat, 0.50) * 1000 if n else None,
+        'latency_p99_ms': percentile(lat, 0.99) * 1000 if n else None,
+        'latency_max_ms': lat[-1] * 1000 if n else None,
+        'db_rows': rows,
+        'db_rows_per_s': rows / (flushed - received[0]) if n else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(old, new):
+    for key, label in COMPARED:
+        a, b = old.get(key), new.get(key)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a * 100 if a else 0.0
+        print(f'  {label:18s} {a:12.1f} -> {b:12.1f}  ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--rate', type=float, default=0, help='publish rate in msg/s, 0 = as fast as possible')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--sensors', type=int, default=3, choices=(1, 2, 3))
+    parser.add_argument('--combined', action='store_true', help='one message per room with all its sensors')
+    parser.add_argument('--direct', action='store_true', help='skip MQTT, call handle_message directly')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for the last message')
+    parser.add_argument('--out', help='write the result to this JSON file')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    parser.add_argument('--verbose', action='store_true', help='show the ingest service log')
+    parser.add_argument('--publisher', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.publisher:
+        run_publisher(args)
+        return
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        print(f'compared with {args.compare} ({old.get("time")}):')
+        compare(old, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Payload parsing cost per message: the previous json + alias-chain parsing vs. the
+compiled per-topic extractors (with orjson when it is installed), and
+size / decode speed of JSON vs. the compact binary payload.
+    python benchmarks/bench_payloads.py [--messages 200000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import payloads
+import room_config
+
+
+def make_messages(count):
+    topics = [(topic, sensor) for room in room_config.ROOMS.values() for sensor, topic in room["sensors"].items()]
+    keys = {'temperature': 'temperature', 'humidity': 'humidity', 'light': 'lux'}
+    messages = []
+    for i in range(count):
+        topic, sensor = topics[i % len(topics)]
+        messages.append((topic, json.dumps({keys[sensor]: 20.0 + (i % 100) / 10})))
+    return messages
+
+
+def guess_keys(messages):
+    # the previous per-message path, copied from the old DataManagerApp.on_message_gui
+    # without its logging; routing goes through the router in both cases
+    latest = {}
+    for topic, payload in messages:
+        try:
+            data = json.loads(payload)
+        except Exception:
+            data = None
+        if not isinstance(data, dict):
+            continue
+        room_name, sensor_type = room_config.route_topic(topic)
+        if not room_name:
+            continue
+        try:
+            if sensor_type == 'temperature' or 'temperature' in data:
+                val = data.get('temperature') or data.get('temp') or data.get('Temp') or data.get('TEMP')
+                if val is not None:
+                    latest['temperature'] = float(val)
+        except Exception:
+            pass
+        try:
+            if sensor_type == 'humidity' or 'humidity' in data:
+                val = data.get('humidity')
+                if val is None:
+                    val = data.get('Humidity (%)')
+                if val is None:
+                    val = data.get('humidity_%')
+                if val is None:
+                    val = data.get('hum')
+                if val is not None:
+                    if isinstance(val, str):
+                        val = val.replace('%', '').strip()
+                    latest['humidity'] = float(val)
+        except Exception:
+            pass
+        try:
+            if sensor_type == 'light' or sensor_type == 'lux' or 'lux' in data:
+                val = data.get('lux') or data.get('light') or data.get('Light') or data.get('lux')
+                if val is not None:
+                    latest['lux'] = float(val)
+        except Exception:
+            pass
+
+
+def compiled(messages):
+    for topic, payload in messages:
+        room_config.parse_message(topic, payload)
+
+
+def compare_encodings(count):
+    readings = [{'temperature': round(20.0 + (i % 100) / 10, 1)} for i in range(count)]
+    combined = [{'temperature': 22.4, 'humidity': 48.3, 'lux': 812.0}] * count
+    print('encoding                     bytes  decode µs/message')
+    for label, samples in (('1 reading', readings), ('3 readings', combined)):
+        for name, encode, decode in (('JSON (stdlib)', json.dumps, json.loads),
+                                     ('JSON', json.dumps, payloads.decode),
+                                     ('binary', payloads.encode_binary, payloads.decode)):
+            encoded = [encode(r) for r in samples]
+            t = time.perf_counter()
+            for p in encoded:
+                decode(p)
+            elapsed = time.perf_counter() - t
+            size = sum(len(p) for p in encoded) / len(encoded)
+            print(f'{name + ", " + label:26s} {size:7.1f}  {elapsed / len(encoded) * 1e6:8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    print(f'JSON decoder: {payloads._loads.__module__}')
+    for name, fn in (('previous alias chain', guess_keys), ('compiled extractors', compiled)):
+        t = time.perf_counter()
+        fn(messages)
+        elapsed = time.perf_counter() - t
+        print(f'{name:22s} {elapsed / len(messages) * 1e6:6.2f} µs/message')
+    print()
+    compare_encodings(args.messages)
+
+
+if __name__ == '__main__':
+    main()
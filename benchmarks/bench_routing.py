@@ -0,0 +1,94 @@
+"""Topic routing microbenchmark: linear ROOMS scan vs room_config.TopicRouter.
+
+Run from the project directory:
+    python benchmarks/bench_routing.py [--topics 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import room_config
+
+
+SENSORS = ('temperature', 'humidity', 'light')
+
+
+def make_rooms(n_topics):
+    rooms = {}
+    for i in range(n_topics // len(SENSORS)):
+        rooms[f'Room {i}'] = {
+            'room_id': i,
+            'sensors': {s: f'pr/home/room{i}/{s}' for s in SENSORS},
+        }
+    return rooms
+
+
+# The lookups every message went through before TopicRouter, copied from the
+# old room_config with ROOMS / CUSTOM_TOPIC_MAP passed in: the custom map is
+# checked first and each scan stops at the first match.
+def get_room_from_topic(rooms, custom_map, topic):
+    if topic in custom_map:
+        return custom_map[topic][0]
+    for room_name, room_data in rooms.items():
+        for sensor_name, sensor_topic in room_data["sensors"].items():
+            if sensor_topic == topic:
+                return room_name
+    return None
+
+
+def get_sensor_type_from_topic(rooms, custom_map, topic):
+    if topic in custom_map:
+        return custom_map[topic][1]
+    for room_name, room_data in rooms.items():
+        for sensor_name, sensor_topic in room_data["sensors"].items():
+            if sensor_topic == topic:
+                return sensor_name
+    return None
+
+
+def scan_route(rooms, custom_map, topic):
+    return (get_room_from_topic(rooms, custom_map, topic),
+            get_sensor_type_from_topic(rooms, custom_map, topic))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--topics', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    rooms = make_rooms(args.topics)
+    custom_map = room_config.CUSTOM_TOPIC_MAP
+    topics = [t for r in rooms.values() for t in r['sensors'].values()]
+    sample = [random.choice(topics) for _ in range(args.lookups)]
+
+    exact = room_config.TopicRouter()
+    for room_name, room_data in rooms.items():
+        for sensor_name, topic in room_data['sensors'].items():
+            exact.add(topic, room_name, sensor_name)
+
+    wildcard = room_config.TopicRouter()
+    wildcard.add('pr/home/+/+', '{0}', '{1}')
+
+    # the scan is far slower, so time fewer lookups and scale per lookup
+    scan_sample = sample[:max(1, args.lookups // 20)]
+    results = [
+        ('linear scan', len(scan_sample), timeit.timeit(lambda: [scan_route(rooms, custom_map, t) for t in scan_sample], number=1)),
+        ('router (exact)', len(sample), timeit.timeit(lambda: [exact.route(t) for t in sample], number=5) / 5),
+        ('router (wildcard, cold)', len(sample), timeit.timeit(lambda: [wildcard.route(t) for t in sample], number=1)),
+        ('router (wildcard, warm)', len(sample), timeit.timeit(lambda: [wildcard.route(t) for t in sample], number=5) / 5),
+    ]
+
+    print(f'{len(topics)} topics')
+    base = results[0][2] / results[0][1]
+    for name, n, elapsed in results:
+        per = elapsed / n
+        print(f'{name:26s} {per * 1e6:12.3f} us/lookup  x{base / per:,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Cold-start import time of the application modules.
+
+Each import runs in a fresh interpreter, so module-level work (such as the
+DNS lookups mqtt_init and single_sensor used to do) is counted every time.
+Run from the project directory, e.g. before and after a change:
+    python benchmarks/bench_startup.py [--runs 5] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import time
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+'''
+
+
+def time_import(module):
+    proc = subprocess.run([sys.executable, '-c', SNIPPET.format(module=module)],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        # e.g. the old module-level gethostbyname() raising without network
+        return None, proc.stderr.strip().splitlines()[-1] if proc.stderr else 'failed'
+    return float(proc.stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('modules', nargs='*', default=['broker_config', 'mqtt_init', 'single_sensor', 'data_manager'])
+    args = parser.parse_args()
+
+    for module in args.modules:
+        times = []
+        error = None
+        for _ in range(args.runs):
+            elapsed, error = time_import(module)
+            if error:
+                break
+            times.append(elapsed)
+        if error:
+            print(f'{module:16s} import failed: {error}')
+        else:
+            print(f'{module:16s} median {statistics.median(times) * 1000:8.1f} ms  '
+                  f'max {max(times) * 1000:8.1f} ms  ({args.runs} runs)')
+
+
+if __name__ == '__main__':
+    main()
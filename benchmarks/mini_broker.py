@@ -0,0 +1,158 @@
+"""Minimal MQTT 3.1.1 broker for local benchmarks, no internet or real broker needed.
+
+Handles CONNECT, SUBSCRIBE/UNSUBSCRIBE with + and # filters, PUBLISH (QoS 0/1
+in, always delivered as QoS 0), PINGREQ and DISCONNECT. No retained
+messages, sessions or authentication: it only exists so the real paho
+clients can be driven end to end on localhost.
+    python benchmarks/mini_broker.py [--port 1883]
+prints "listening on <port>" once it accepts connections.
+"""
+import argparse
+import socket
+import struct
+import threading
+
+
+def _encode_length(n):
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def _read_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError('client closed the connection')
+        buf += chunk
+    return bytes(buf)
+
+
+def topic_matches(pattern, topic):
+    p = pattern.split('/')
+    t = topic.split('/')
+    for i, level in enumerate(p):
+        if level == '#':
+            return True
+        if i >= len(t) or (level != '+' and level != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+class _Session:
+    def __init__(self, sock):
+        self.sock = sock
+        self.filters = []
+        self.send_lock = threading.Lock()
+
+    def send(self, data):
+        with self.send_lock:
+            self.sock.sendall(data)
+
+
+class MiniBroker:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        while True:
+            sock, _addr = self.server.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock):
+        session = _Session(sock)
+        with self._lock:
+            self._sessions.append(session)
+        try:
+            while True:
+                header = _read_exact(sock, 1)[0]
+                length, shift = 0, 0
+                while True:
+                    byte = _read_exact(sock, 1)[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = _read_exact(sock, length) if length else b''
+                kind = header >> 4
+                if kind == 1:  # CONNECT
+                    session.send(b'\x20\x02\x00\x00')
+                elif kind == 3:  # PUBLISH
+                    self._publish(session, header, body)
+                elif kind == 8:  # SUBSCRIBE
+                    self._subscribe(session, body)
+                elif kind == 10:  # UNSUBSCRIBE
+                    pos = 2
+                    while pos < len(body):
+                        n = struct.unpack_from('!H', body, pos)[0]
+                        topic = body[pos + 2:pos + 2 + n].decode()
+                        if topic in session.filters:
+                            session.filters.remove(topic)
+                        pos += 2 + n
+                    session.send(b'\xb0\x02' + body[:2])
+                elif kind == 12:  # PINGREQ
+                    session.send(b'\xd0\x00')
+                elif kind == 14:  # DISCONNECT
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._sessions.remove(session)
+            sock.close()
+
+    def _subscribe(self, session, body):
+        packet_id = body[:2]
+        pos = 2
+        granted = bytearray()
+        while pos < len(body):
+            n = struct.unpack_from('!H', body, pos)[0]
+            session.filters.append(body[pos + 2:pos + 2 + n].decode())
+            pos += 3 + n
+            granted.append(0)
+        session.send(b'\x90' + _encode_length(2 + len(granted)) + packet_id + bytes(granted))
+
+    def _publish(self, session, header, body):
+        n = struct.unpack_from('!H', body)[0]
+        topic_bytes = body[2:2 + n]
+        pos = 2 + n
+        if (header >> 1) & 3:
+            # QoS 1: acknowledge right away
+            session.send(b'\x40\x02' + body[pos:pos + 2])
+            pos += 2
+        variable = body[:2 + n] + body[pos:]
+        packet = b'\x30' + _encode_length(len(variable)) + variable
+        topic = topic_bytes.decode('utf-8', 'ignore')
+        with self._lock:
+            targets = [s for s in self._sessions if any(topic_matches(f, topic) for f in s.filters)]
+        for target in targets:
+            try:
+                target.send(packet)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883, help='0 picks a free port')
+    args = parser.parse_args()
+    broker = MiniBroker(args.host, args.port)
+    print(f'listening on {broker.port}', flush=True)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
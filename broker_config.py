@@ -0,0 +1,48 @@
+import configparser
+import os
+
+nb=1 # 0- HIT-"139.162.222.115", 1 - open HiveMQ - broker.hivemq.com
+brokers=['vmm1.saaintertrade.com', 'broker.hivemq.com']
+ports=['80','1883']
+usernames = ['MATZI',''] # should be modified for HIT
+passwords = ['MATZI',''] # should be modified for HIT
+
+
+class BrokerConfig:
+    """Where to connect. Nothing here touches the network: the host name is
+    resolved by paho inside its network thread (connect_async + loop_start),
+    so importing this module never blocks on DNS or fails when offline.
+
+    Defaults come from the tables above (index nb). They can be overridden by
+    an INI file with a [broker] section (path in $MQTT_CONFIG, default
+    broker.ini next to this file) and then by $MQTT_HOST, $MQTT_PORT,
+    $MQTT_USERNAME and $MQTT_PASSWORD, e.g. MQTT_HOST=localhost for a local broker."""
+
+    def __init__(self, host, port, username='', password=''):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+
+    @classmethod
+    def load(cls, index=nb):
+        cfg = cls(brokers[index], ports[index], usernames[index], passwords[index])
+        path = os.environ.get('MQTT_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'broker.ini'))
+        parser = configparser.ConfigParser()
+        if parser.read(path) and parser.has_section('broker'):
+            section = parser['broker']
+            cfg.host = section.get('host', cfg.host)
+            cfg.port = section.getint('port', cfg.port)
+            cfg.username = section.get('username', cfg.username)
+            cfg.password = section.get('password', cfg.password)
+        cfg.host = os.environ.get('MQTT_HOST', cfg.host)
+        cfg.port = int(os.environ.get('MQTT_PORT', cfg.port))
+        cfg.username = os.environ.get('MQTT_USERNAME', cfg.username)
+        cfg.password = os.environ.get('MQTT_PASSWORD', cfg.password)
+        return cfg
+
+    def __str__(self):
+        return f'{self.host}:{self.port}'
+
+
+broker = BrokerConfig.load()
@@ -1,30 +1,67 @@
+import os
 import sys
-import json
+import argparse
 import sqlite3
-from datetime import datetime
+import time
 
-import paho.mqtt.client as mqtt
-from PyQt5 import QtWidgets, QtCore
+from PyQt5 import QtWidgets, QtCore, QtGui
 
 
 try:
     from matplotlib.figure import Figure
     from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+    from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+    import numpy as np
+    from downsample import lttb
     HAS_MPL = True
 except Exception:
     HAS_MPL = False
 
+try:
+    import reading_stats
+    HAS_NUMPY = True
+except Exception:
+    HAS_NUMPY = False
+
+import exporter
+import log_console
+import metrics
 import mqtt_init
-from mqtt_init import client_init, send_msg
+import profiling
+import payloads
+import retention
 import room_config
+import storage
+from alarms import DEFAULT_THRESHOLDS
+from ingest_service import IngestService
+from log_console import LogConsole
+from recent_history import RecentHistory
+from sparkline import Sparkline
+from history_model import MessageTableModel, SeriesCache
+
+
+# metric -> key of its value label in room_cards, and how the value is shown
+METRIC_LABELS = {'temperature': 'temp_val', 'humidity': 'hum_val', 'lux': 'lux_val'}
+METRIC_FORMATS = {'temperature': '{:.1f}°C', 'humidity': '{:.1f}%', 'lux': '{:.0f}'}
+
+# entries kept in the alarm list
+MAX_ALARM_ITEMS = 100
+
+# history shown by the card sparklines, and how often the visible ones are redrawn
+SPARK_SECONDS = 10 * 60
+SPARK_INTERVAL_MS = 1000
 
 
 class MqttMessageEvent(QtCore.QObject):
-    message_received = QtCore.pyqtSignal(str, str)
+    # carries an ingest_service.Message from the MQTT thread to the GUI thread
+    message_received = QtCore.pyqtSignal(object)
+    alarm_raised = QtCore.pyqtSignal(object)
+    status_changed = QtCore.pyqtSignal(bool, str)
+    log_message = QtCore.pyqtSignal(str)
 
 
 class DataManagerApp(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, viewer=False, log_level=log_console.INFO, metrics_port=None, ingest_options=None):
         super().__init__()
         self.setWindowTitle('Vessel Application')
         self.resize(1200, 700)
@@ -37,8 +74,10 @@ class DataManagerApp(QtWidgets.QMainWindow):
         QPushButton#secondary { background: transparent; color: #9fbfc0; border: 1px solid #1f2a33; }
         QFrame#card { background: #0f1b22; border-radius: 12px; padding: 12px; }
         QLabel#metricValue { font-size: 28px; font-weight: 600; color: #ffffff; }
+        QLabel#metricValue[state="ok"] { color: #9ff4ea; }
+        QLabel#metricValue[state="alarm"] { color: #ff6b6b; }
         QLabel#metricLabel { color: #9fbfc0; }
-        QTextEdit { background: #071018; border: 1px solid #122027; border-radius: 8px; }
+        QTextEdit, QPlainTextEdit { background: #071018; border: 1px solid #122027; border-radius: 8px; }
         QDoubleSpinBox { background: #071018; border: 1px solid #122027; color: #d1e8e2; }
         QSlider::handle:horizontal { background: #0f9f9a; }
         QGroupBox { border: none; }
@@ -70,6 +109,8 @@ class DataManagerApp(QtWidgets.QMainWindow):
         # Dictionary to store room UI elements
         self.room_cards = {}
         self.room_latest = {}
+        # (room, metric) pairs whose card changed since it was last painted
+        self._dirty = set()
         
         # Create tab for each room
         for room_name in room_config.get_room_names():
@@ -99,17 +140,20 @@ class DataManagerApp(QtWidgets.QMainWindow):
                 lbl_name = QtWidgets.QLabel(name)
                 lbl_name.setObjectName('metricLabel')
                 lbl_name.setAlignment(QtCore.Qt.AlignCenter)
+                # trend of the last SPARK_SECONDS under the value
+                spark = Sparkline(SPARK_SECONDS * 1000)
                 v.addWidget(lbl_val)
                 v.addWidget(lbl_name)
-                return f, lbl_val
+                v.addWidget(spark)
+                return f, lbl_val, spark
 
-            temp_card, temp_val = make_metric('Temperature (°C)')
-            hum_card, hum_val = make_metric('Humidity (%)')
-            lux_card, lux_val = make_metric('Light (lux)')
+            temp_card, temp_val, temp_spark = make_metric('Temperature (°C)')
+            hum_card, hum_val, hum_spark = make_metric('Humidity (%)')
+            lux_card, lux_val, lux_spark = make_metric('Light (lux)')
 
-            temp_card.setFixedSize(240, 140)
-            hum_card.setFixedSize(240, 140)
-            lux_card.setFixedSize(240, 140)
+            temp_card.setFixedSize(240, 180)
+            hum_card.setFixedSize(240, 180)
+            lux_card.setFixedSize(240, 180)
 
             metrics_row.addWidget(temp_card)
             metrics_row.addWidget(hum_card)
@@ -122,7 +166,8 @@ class DataManagerApp(QtWidgets.QMainWindow):
                 'frame': center_card,
                 'temp_val': temp_val,
                 'hum_val': hum_val,
-                'lux_val': lux_val
+                'lux_val': lux_val,
+                'sparks': {'temperature': temp_spark, 'humidity': hum_spark, 'lux': lux_spark},
             }
             
             self.room_tabs.addTab(center_card, room_name)
@@ -164,6 +209,12 @@ class DataManagerApp(QtWidgets.QMainWindow):
 
         layout.addLayout(thr_layout)
 
+        # Alarm list (newest first); alarms never block the UI with dialogs
+        self.alarm_list = QtWidgets.QListWidget()
+        self.alarm_list.setFixedHeight(90)
+        self.alarm_list.setStyleSheet('QListWidget { background: #071018; border: 1px solid #122027; border-radius: 8px; }')
+        layout.addWidget(self.alarm_list)
+
         # Action controls below card
         actions = QtWidgets.QHBoxLayout()
         actions.setAlignment(QtCore.Qt.AlignCenter)
@@ -185,8 +236,8 @@ class DataManagerApp(QtWidgets.QMainWindow):
         layout.addLayout(actions)
 
         # Collapsible log area (starts visible)
-        self.log = QtWidgets.QTextEdit()
-        self.log.setReadOnly(True)
+        # bounded and repainted at most 10 times a second, however fast messages arrive
+        self.log = LogConsole(max_blocks=2000, fps=10, level=log_level)
         self.log.setFixedHeight(220)
         self.log.setVisible(True)
         layout.addWidget(self.log)
@@ -196,38 +247,81 @@ class DataManagerApp(QtWidgets.QMainWindow):
         self.lbl_status.setAlignment(QtCore.Qt.AlignCenter)
         self.lbl_status.setStyleSheet('color: #9fbfc0;')
         layout.addWidget(self.lbl_status)
-
-        # DB init
-        self.db_path = 'sensor_data.db'
-        self._ensure_db()
+        # connection state, followed by the metrics summary of update_status_metrics
+        self._status_text = 'Disconnected'
+        self._metrics_summary = ''
 
         # MQTT
-        self.client = None
         self.mqtt_events = MqttMessageEvent()
         self.mqtt_events.message_received.connect(self.on_message_gui)
+        self.mqtt_events.alarm_raised.connect(self.on_alarm)
+        self.mqtt_events.status_changed.connect(self.on_status_changed)
+        self.mqtt_events.log_message.connect(self.append_log)
+        self._gui_time = metrics.REGISTRY.histogram('smarthome_gui_message_seconds',
+                                                    'GUI thread time per received message')
+
+        # DB init
+        self.db_path = storage.DB_PATH
+        self._ensure_db()
 
         # keep track if connected
         self._connected = False
 
-        # Timer to refresh metric cards
+        # Ingest (subscribe/parse/route/persist/alarm) runs off the GUI thread in IngestService.
+        # In viewer mode a separate `ingest_service.py` process owns the store and we only read it.
+        self.viewer = viewer
+        if viewer:
+            self.ingest = None
+            # filled by _poll_latest, for the sparklines
+            self.recent = RecentHistory()
+            self.btn_connect.setEnabled(False)
+            self.set_status('Viewer mode - reading ' + self.db_path)
+            self._latest_timer = QtCore.QTimer(self)
+            self._latest_timer.timeout.connect(self._poll_latest)
+            self._latest_timer.start(1000)
+            self._poll_latest()
+        else:
+            # retention stays off unless the command line asked for it (retention.add_arguments)
+            self.ingest = IngestService(self.db_path, client_name='DataMgr-', log=self.mqtt_events.log_message.emit,
+                                        **(ingest_options or {}))
+            self.ingest.listeners.append(self.mqtt_events.message_received.emit)
+            self.ingest.alarm_listeners.append(self.mqtt_events.alarm_raised.emit)
+            self.ingest.status_listeners.append(self.mqtt_events.status_changed.emit)
+            self.recent = self.ingest.recent
+            self._sync_thresholds()
+            for spin in (self.temp_thr, self.hum_thr, self.lux_thr):
+                spin.valueChanged.connect(self._sync_thresholds)
+            self.ingest.start()
+
+        # Metric cards are repainted from the dirty set at most 10 times a second
+        self._thr_spins = {'temperature': self.temp_thr, 'humidity': self.hum_thr, 'lux': self.lux_thr}
+        for spin in self._thr_spins.values():
+            spin.valueChanged.connect(self._mark_all_dirty)
+        self._mark_all_dirty()
         self._display_timer = QtCore.QTimer(self)
         self._display_timer.timeout.connect(self.update_display)
-        self._display_timer.start(1000)
+        self._display_timer.start(100)
+
+        # sparklines: only the visible room's, and only when its series got a new sample
+        self._spark_shown = {}  # (room, metric) -> newest ts drawn
+        self._spark_timer = QtCore.QTimer(self)
+        self._spark_timer.timeout.connect(self.update_sparklines)
+        self._spark_timer.start(SPARK_INTERVAL_MS)
+
+        # ingest metrics summarised in the footer once a second, optionally scraped over HTTP
+        self._metrics_prev = None
+        self._metrics_timer = QtCore.QTimer(self)
+        self._metrics_timer.timeout.connect(self.update_status_metrics)
+        self._metrics_timer.start(1000)
+        self.metrics_server = metrics.serve(metrics_port) if metrics_port else None
+        if self.metrics_server:
+            self.append_log(f'Metrics on http://127.0.0.1:{metrics_port}/metrics')
         
 
     def _ensure_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = storage.connect(self.db_path)
         try:
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ts TEXT,
-                    topic TEXT,
-                    payload TEXT
-                )
-            ''')
-            conn.commit()
+            storage.ensure_schema(conn)
         finally:
             conn.close()
 
@@ -238,51 +332,110 @@ class DataManagerApp(QtWidgets.QMainWindow):
             self.disconnect_mqtt()
 
     def connect_mqtt(self):
-        self.append_log('Connecting to MQTT broker...')
+        if self.ingest.client is not None:
+            # still retrying after a refused or lost connection
+            self.ingest.disconnect()
+        self.append_log(f'Connecting to MQTT broker {mqtt_init.broker}...')
         try:
-            self.client = client_init('DataMgr-')
+            # returns at once; DNS and connect happen on the MQTT thread, see on_status_changed
+            self.ingest.connect()
         except Exception as e:
             self.append_log('MQTT client init failed: ' + str(e))
             return
-
-        # override on_message to forward to Qt thread
-        def _on_message(client, userdata, msg):
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8', 'ignore')
-            # emit to GUI thread
-            self.mqtt_events.message_received.emit(topic, payload)
-
-        self.client.on_message = _on_message
-        try:
-            # subscribe to common topic prefix
-            sub = mqtt_init.comm_topic + '#'
-            self.client.subscribe(sub)
-            self.client.loop_start()
-            self._connected = True
-            self.btn_connect.setText('Disconnect')
-            self.lbl_status.setText('Connected')
-            self.append_log('Subscribed to: ' + sub)
-        except Exception as e:
-            self.append_log('MQTT connect/subscribe failed: ' + str(e))
+        self._connected = True
+        self.btn_connect.setText('Disconnect')
+        self.set_status('Connecting...')
 
     def disconnect_mqtt(self):
-        if self.client:
-            try:
-                self.client.loop_stop()
-                self.client.disconnect()
-            except Exception:
-                pass
+        self.ingest.disconnect()
         self._connected = False
         self.btn_connect.setText('Connect')
-        self.lbl_status.setText('Disconnected')
+        self.set_status('Disconnected')
         self.append_log('Disconnected from broker')
 
+    @QtCore.pyqtSlot(bool, str)
+    def on_status_changed(self, connected, text):
+        if self.ingest.client is None:
+            # late callback after the user pressed Disconnect
+            return
+        # refused or lost: paho keeps retrying, but the button offers Connect again
+        self._connected = connected
+        self.btn_connect.setText('Disconnect' if connected else 'Connect')
+        self.set_status(text)
+        self.append_log(text)
+
+    def set_status(self, text):
+        self._status_text = text
+        self.lbl_status.setText(f'{text}  |  {self._metrics_summary}' if self._metrics_summary else text)
+
+    def update_status_metrics(self):
+        # rates and the DB write p99 cover the last interval only, from the change of each metric
+        if self.ingest is None:
+            return
+        registry = self.ingest.registry
+        db_time = registry.get('smarthome_db_write_seconds')
+        current = (time.monotonic(), self.ingest.message_count, registry.get('smarthome_alarms_total').value,
+                   list(db_time.counts), self._gui_time.count, self._gui_time.sum)
+        prev, self._metrics_prev = self._metrics_prev, current
+        if prev is None:
+            return
+        elapsed = current[0] - prev[0]
+        p99 = db_time.quantile(0.99, since=prev[3])
+        if p99 is None:
+            db_text = 'DB idle'
+        elif p99 == float('inf'):
+            db_text = f'DB write p99 > {db_time.buckets[-1] * 1000:g} ms'
+        else:
+            db_text = f'DB write p99 < {p99 * 1000:g} ms'
+        gui_messages = current[4] - prev[4]
+        self._metrics_summary = '   '.join([
+            f'{(current[1] - prev[1]) / elapsed:.0f} msg/s',
+            f'parse errors {registry.get("smarthome_parse_failures_total").value}',
+            f'queue {registry.get("smarthome_db_queue_depth").value}',
+            db_text,
+            f'alarms {(current[2] - prev[2]) / elapsed:.1f}/s',
+            f'GUI {(current[5] - prev[5]) / gui_messages * 1000:.2f} ms/msg' if gui_messages else 'GUI idle',
+        ])
+        self.set_status(self._status_text)
+
+    def _sync_thresholds(self, *args):
+        # the ingest thread reads these for alarming
+        self.ingest.thresholds['temperature'] = float(self.temp_thr.value())
+        self.ingest.thresholds['humidity'] = float(self.hum_thr.value())
+        self.ingest.thresholds['lux'] = float(self.lux_thr.value())
+
+    def _poll_latest(self):
+        # viewer mode: pick up the newest values written by the ingest process
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for room_name, latest in self.room_latest.items():
+                room_id = room_config.get_room_id(room_name)
+                for sensor in latest:
+                    value = storage.fetch_latest(conn, room_id, sensor)
+                    if value is not None and value != latest[sensor]:
+                        latest[sensor] = value
+                        self._dirty.add((room_name, sensor))
+                        self.recent.add(room_name, {sensor: value})
+        finally:
+            conn.close()
+
     def on_room_changed(self, index):
         """Handle room tab change"""
         room_names = room_config.get_room_names()
         if 0 <= index < len(room_names):
             self.current_room = room_names[index]
+            # the newly shown labels may be stale, repaint them all right away
+            for metric in METRIC_FORMATS:
+                self._dirty.add((self.current_room, metric))
             self.update_display()
+            self.update_sparklines()
+
+    def _mark_all_dirty(self, *args):
+        for room_name in self.room_latest:
+            for metric in METRIC_FORMATS:
+                self._dirty.add((room_name, metric))
+        # thresholds are drawn into the sparklines too
+        self._spark_shown = {}
 
     def toggle_console(self, checked: bool):
         # Show/hide the log console
@@ -302,205 +455,188 @@ class DataManagerApp(QtWidgets.QMainWindow):
             self.log.setVisible(False)
             self.btn_toggle_log.setText('Show Console')
 
-    def append_log(self, text):
-        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        self.log.append(f'[{ts}] {text}')
+    def append_log(self, text, level=log_console.INFO):
+        self.log.log(text, level)
 
-    @QtCore.pyqtSlot(str, str)
-    def on_message_gui(self, topic, payload):
-        self.append_log(f'MQTT {topic}: {payload}')
-        # Save to DB
-        self._save_message(topic, payload)
-        # Process payload
-        try:
-            data = json.loads(payload)
-        except Exception:
-            data = None
+    @QtCore.pyqtSlot(object)
+    def on_message_gui(self, msg):
+        start = time.perf_counter()
+        self._show_message(msg)
+        self._gui_time.observe(time.perf_counter() - start)
 
-        if isinstance(data, dict):
-            # Determine which room this message belongs to
-            room_name = room_config.get_room_from_topic(topic)
-            sensor_type = room_config.get_sensor_type_from_topic(topic)
-            self.append_log(f'DEBUG: Topic {topic} mapped to room: {room_name}, sensor: {sensor_type}')
-            
-            if room_name:
-                # cache latest numeric readings for this room
-                # Try multiple possible key names for robustness
-                try:
-                    if sensor_type == 'temperature' or 'temperature' in data:
-                        val = data.get('temperature') or data.get('temp') or data.get('Temp') or data.get('TEMP')
-                        if val is not None:
-                            self.room_latest[room_name]['temperature'] = float(val)
-                except Exception as e:
-                    self.append_log(f'DEBUG: Failed to parse temperature: {e}')
-                
-                try:
-                    if sensor_type == 'humidity' or 'humidity' in data:
-                        # Handle various humidity formats
-                        val = data.get('humidity')
-                        if val is None:
-                            val = data.get('Humidity (%)')
-                        if val is None:
-                            val = data.get('humidity_%')
-                        if val is None:
-                            val = data.get('hum')
-                        
-                        if val is not None:
-                            # Remove % sign if present
-                            if isinstance(val, str):
-                                val = val.replace('%', '').strip()
-                            self.room_latest[room_name]['humidity'] = float(val)
-                            self.append_log(f'DEBUG: Updated {room_name} humidity to {self.room_latest[room_name]["humidity"]}')
-                except Exception as e:
-                    self.append_log(f'DEBUG: Failed to parse humidity: {e}')
-                
-                try:
-                    if sensor_type == 'light' or sensor_type == 'lux' or 'lux' in data:
-                        val = data.get('lux') or data.get('light') or data.get('Light') or data.get('lux')
-                        if val is not None:
-                            self.room_latest[room_name]['lux'] = float(val)
-                except Exception as e:
-                    self.append_log(f'DEBUG: Failed to parse lux: {e}')
-
-            self._process_data(topic, data)
-
-            # immediate UI refresh
-            self.update_display()
+    def _show_message(self, msg):
+        # msg was already parsed, routed and queued for the DB by IngestService
+        self.append_log(f'MQTT {msg.topic}: {payloads.to_text(msg.payload)}')
+        if msg.data is None:
+            return
+        # skip building the debug strings entirely unless debug logging is on
+        debug = self.log.level <= log_console.DEBUG
+        if debug:
+            self.append_log(f'DEBUG: Topic {msg.topic} mapped to room: {msg.room}, sensor: {msg.sensor}',
+                            log_console.DEBUG)
+        if msg.room in self.room_latest:
+            # cache latest numeric readings for this room; a combined per-room
+            # message (sensor room_config.COMBINED) updates the whole card at once
+            self.room_latest[msg.room].update(msg.values)
+            self._dirty.update((msg.room, metric) for metric in msg.values)
+            if debug and msg.values:
+                self.append_log(f'DEBUG: Updated {msg.room}: {msg.values}', log_console.DEBUG)
+        # the cards are repainted by the display timer, not per message
 
     def update_display(self):
-        # Get the current room's latest data
-        room_data = self.room_latest.get(self.current_room, {'temperature': None, 'humidity': None, 'lux': None})
-        room_ui = self.room_cards.get(self.current_room, {})
-        
+        # repaint only the visible room's labels that changed since the last frame;
+        # other rooms stay dirty until their tab is shown
+        if not self._dirty:
+            return
+        room = self.current_room
+        room_data = self.room_latest.get(room)
+        room_ui = self.room_cards.get(room)
         if not room_ui:
             return
-        
-        # Temperature
-        t = room_data.get('temperature')
-        temp_label = room_ui.get('temp_val')
-        if temp_label:
-            if t is None:
-                temp_label.setText('--')
-                temp_label.setStyleSheet('color: #ffffff')
-            else:
-                temp_label.setText(f'{t:.1f}°C')
-                if t >= float(self.temp_thr.value()):
-                    temp_label.setStyleSheet('color: #ff6b6b')
-                else:
-                    temp_label.setStyleSheet('color: #9ff4ea')
-
-        # Humidity
-        h = room_data.get('humidity')
-        hum_label = room_ui.get('hum_val')
-        if hum_label:
-            if h is None:
-                hum_label.setText('--')
-                hum_label.setStyleSheet('color: #ffffff')
-            else:
-                hum_label.setText(f'{h:.1f}%')
-                if h >= float(self.hum_thr.value()):
-                    hum_label.setStyleSheet('color: #ff6b6b')
-                else:
-                    hum_label.setStyleSheet('color: #9ff4ea')
-
-        # Lux
-        l = room_data.get('lux')
-        lux_label = room_ui.get('lux_val')
-        if lux_label:
-            if l is None:
-                lux_label.setText('--')
-                lux_label.setStyleSheet('color: #ffffff')
-            else:
-                lux_label.setText(f'{l:.0f}')
-                if l >= float(self.lux_thr.value()):
-                    lux_label.setStyleSheet('color: #ff6b6b')
-                else:
-                    lux_label.setStyleSheet('color: #9ff4ea')
 
-    def _save_message(self, topic, payload):
-        conn = sqlite3.connect(self.db_path)
-        try:
-            c = conn.cursor()
-            c.execute('INSERT INTO messages (ts, topic, payload) VALUES (?, ?, ?)',
-                      (datetime.now().isoformat(), topic, payload))
-            conn.commit()
-        finally:
-            conn.close()
-
-    def _process_data(self, topic, data):
-        # Check for common sensor keys and thresholds
-        alarms = []
-        if 'temperature' in data:
-            try:
-                t = float(data['temperature'])
-                if t >= float(self.temp_thr.value()):
-                    alarms.append(f'Temperature high: {t}')
-            except Exception:
-                pass
-
-        if 'humidity' in data:
-            try:
-                h = float(data['humidity'])
-                if h >= float(self.hum_thr.value()):
-                    alarms.append(f'Humidity high: {h}')
-            except Exception:
-                pass
-
-        if 'lux' in data:
-            try:
-                l = float(data['lux'])
-                if l >= float(self.lux_thr.value()):
-                    alarms.append(f'Light (lux) high: {l}')
-            except Exception:
-                pass
-
-        # Gas threshold from mqtt_init
-        if 'gas_weight' in data:
-            try:
-                g = float(data['gas_weight'])
-                if g >= float(mqtt_init.gas_weight_THR):
-                    alarms.append(f'Gas weight alarm: {g}')
-            except Exception:
-                pass
-
-        if alarms:
-            msg = ' | '.join(alarms)
-            self.append_log('ALARM: ' + msg)
-            # publish alarm
-            try:
-                send_msg(self.client, mqtt_init.topic_alarm, msg)
-            except Exception as e:
-                self.append_log('Failed to send alarm: ' + str(e))
-            # show GUI alert
-            QtWidgets.QMessageBox.warning(self, 'Alarm', msg)
+        for metric, fmt in METRIC_FORMATS.items():
+            if (room, metric) not in self._dirty:
+                continue
+            self._dirty.discard((room, metric))
+            label = room_ui[METRIC_LABELS[metric]]
+            value = room_data.get(metric)
+            if value is None:
+                text, state = '--', 'empty'
+            else:
+                text = fmt.format(value)
+                state = 'alarm' if value >= float(self._thr_spins[metric].value()) else 'ok'
+            if label.text() != text:
+                label.setText(text)
+            # colors come from the [state=...] rules in the window stylesheet,
+            # switching the property only re-polishes this one label
+            if label.property('state') != state:
+                label.setProperty('state', state)
+                label.style().unpolish(label)
+                label.style().polish(label)
+
+    def update_sparklines(self):
+        # hidden tabs and a minimized window cost nothing; a tab is brought
+        # up to date when it is shown (on_room_changed)
+        if not self.isVisible() or self.isMinimized():
+            return
+        room = self.current_room
+        room_ui = self.room_cards.get(room)
+        if not room_ui:
+            return
+        for metric, spark in room_ui['sparks'].items():
+            latest = self.recent.latest(room, metric)
+            if latest is None or self._spark_shown.get((room, metric)) == latest[0]:
+                continue
+            self._spark_shown[(room, metric)] = latest[0]
+            ts, values = self.recent.window(room, metric, since_ms=latest[0] - SPARK_SECONDS * 1000)
+            spark.set_data(ts, values, float(self._thr_spins[metric].value()))
+
+    @QtCore.pyqtSlot(object)
+    def on_alarm(self, event):
+        # non-blocking notification: list entry plus a taskbar flash when not focused
+        ts = time.strftime('%H:%M:%S')
+        item = QtWidgets.QListWidgetItem(f'[{ts}] {event.text}')
+        item.setForeground(QtGui.QColor('#ff6b6b' if event.kind == 'raised' else '#9ff4ea'))
+        self.alarm_list.insertItem(0, item)
+        while self.alarm_list.count() > MAX_ALARM_ITEMS:
+            self.alarm_list.takeItem(self.alarm_list.count() - 1)
+        if event.kind == 'raised':
+            QtWidgets.QApplication.alert(self)
 
     def open_history(self):
-        dlg = HistoryDialog(self, self.db_path)
+        # show rows that are still waiting in the write queue as well
+        if self.ingest:
+            self.ingest.writer.flush()
+        thresholds = {metric: float(spin.value()) for metric, spin in self._thr_spins.items()}
+        dlg = HistoryDialog(self, self.db_path, thresholds, self.ingest.recent if self.ingest else None)
         dlg.exec_()
 
+    def closeEvent(self, event):
+        if self.ingest:
+            self.ingest.stop()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        super().closeEvent(event)
+
+
+def make_room_combo():
+    """Room selector whose item data is the room_ids filter of storage/exporter
+    queries: None for all rooms, [None] for readings of no room."""
+    combo = QtWidgets.QComboBox()
+    combo.addItem('All rooms', None)
+    for name in room_config.get_room_names():
+        combo.addItem(name, [room_config.get_room_id(name)])
+    combo.addItem('Unassigned', [None])
+    return combo
+
+
+# (label, seconds back from now) presets of the time range; None means everything
+TIME_RANGES = [
+    ('Last hour', 3600),
+    ('Last 24 hours', 24 * 3600),
+    ('Last 7 days', 7 * 24 * 3600),
+    ('Last 30 days', 30 * 24 * 3600),
+    ('All time', None),
+    ('Custom', None),
+]
+CUSTOM_RANGE = len(TIME_RANGES) - 1
+
+# columns of the per-room statistics table: (header, key in reading_stats.group_stats rows)
+ROOM_STATS_COLUMNS = [
+    ('Room', None), ('Count', 'count'), ('Min', 'min'), ('Max', 'max'), ('Mean', 'mean'),
+    ('Std', 'std'), ('P50', 'p50'), ('P95', 'p95'), ('P99', 'p99'), ('Rate/h', 'rate_per_h'),
+    ('In alarm %', 'alarm_pct'),
+]
+
 
 class HistoryDialog(QtWidgets.QDialog):
-    def __init__(self, parent=None, db_path='sensor_data.db'):
+    def __init__(self, parent=None, db_path='sensor_data.db', thresholds=None, recent=None):
         super().__init__(parent)
         self.setWindowTitle('Message History & Statistics')
         self.resize(900, 600)
         self.db_path = db_path
+        # used for the "in alarm" column of the per-room statistics
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
 
         # Main layout: controls on top, table left, chart+stats right
         layout = QtWidgets.QVBoxLayout(self)
 
-        # Top controls: metric selector, limit, refresh
+        # Top controls: sensor, room and time range (all applied in SQL), chart limit, refresh
         controls = QtWidgets.QHBoxLayout()
         controls.setAlignment(QtCore.Qt.AlignLeft)
-        controls.addWidget(QtWidgets.QLabel('Metric:'))
+        controls.addWidget(QtWidgets.QLabel('Sensor:'))
         self.metric_combo = QtWidgets.QComboBox()
         self.metric_combo.addItems(['temperature', 'humidity', 'lux'])
         controls.addWidget(self.metric_combo)
 
-        controls.addWidget(QtWidgets.QLabel('Rows:'))
+        controls.addWidget(QtWidgets.QLabel('Room:'))
+        self.room_combo = make_room_combo()
+        controls.addWidget(self.room_combo)
+
+        controls.addWidget(QtWidgets.QLabel('Range:'))
+        self.range_combo = QtWidgets.QComboBox()
+        for label, _seconds in TIME_RANGES:
+            self.range_combo.addItem(label)
+        # not 'All time': the per-room statistics read every raw reading of the range
+        self.range_combo.setCurrentIndex(TIME_RANGES.index(('Last 24 hours', 24 * 3600)))
+        controls.addWidget(self.range_combo)
+
+        # the earliest date stands for "no lower bound"
+        self.from_edit = QtWidgets.QDateTimeEdit()
+        self.from_edit.setMinimumDateTime(QtCore.QDateTime.fromMSecsSinceEpoch(0))
+        self.from_edit.setSpecialValueText('Beginning')
+        self.to_edit = QtWidgets.QDateTimeEdit()
+        for label, edit in (('From:', self.from_edit), ('To:', self.to_edit)):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat('yyyy-MM-dd HH:mm')
+            controls.addWidget(QtWidgets.QLabel(label))
+            controls.addWidget(edit)
+
+        # the table pages in every matching row on demand; this only bounds the chart
+        controls.addWidget(QtWidgets.QLabel('Chart samples:'))
         self.limit_spin = QtWidgets.QSpinBox()
-        self.limit_spin.setRange(10, 5000)
-        self.limit_spin.setValue(500)
+        self.limit_spin.setRange(10, 1000000)
+        self.limit_spin.setValue(5000)
         controls.addWidget(self.limit_spin)
 
         self.btn_refresh = QtWidgets.QPushButton('Refresh')
@@ -510,26 +646,44 @@ class HistoryDialog(QtWidgets.QDialog):
         controls.addStretch()
         layout.addLayout(controls)
 
+        # stepping through a date with the keyboard changes it many times, reload once it settles
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(400)
+        self._filter_timer.timeout.connect(self.load_data)
+        self._set_range_edits()
+        self.range_combo.currentIndexChanged.connect(self.on_range_changed)
+        self.from_edit.dateTimeChanged.connect(self.on_range_edited)
+        self.to_edit.dateTimeChanged.connect(self.on_range_edited)
+        self.room_combo.currentIndexChanged.connect(self.load_data)
+
         # content split: table | chart+stats
         content = QtWidgets.QHBoxLayout()
 
-        # Table for messages (left)
-        self.table = QtWidgets.QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(['id', 'ts', 'topic', 'temperature', 'humidity', 'lux', 'payload'])
+        # recent readings, loaded once per refresh and shared by the chart and the row selection
+        # with `recent` (the ingest's in-memory buffers) short ranges of one room skip the DB
+        self.series = SeriesCache(self.db_path, recent=recent)
+
+        # Table for messages (left); rows are paged in from the DB as the user scrolls
+        self.model = MessageTableModel(self.db_path, parent=self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        # fixed row height so the view never has to measure rows it hasn't painted
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
         self.table.horizontalHeader().setStretchLastSection(False)
         self.table.horizontalHeader().setSectionResizeMode(6, QtWidgets.QHeaderView.Stretch)
         self.table.setAlternatingRowColors(True)
         # make text visible on dark background
         # Dark-blue theme with white text for better contrast
         self.table.setStyleSheet(
-            "QTableWidget { background: #071d3a; color: #ffffff; gridline-color: #08314d; alternate-background-color: #0b2a46; }"
+            "QTableView { background: #071d3a; color: #ffffff; gridline-color: #08314d; alternate-background-color: #0b2a46; }"
             "QHeaderView::section { background: #07253f; color: #ffffff; padding:6px; border: none; }"
-            "QTableWidget::item:selected { background: #0f9f9a; color: #001017; }"
+            "QTableView::item:selected { background: #0f9f9a; color: #001017; }"
         )
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
-        self.table.itemSelectionChanged.connect(self.on_table_select)
+        self.table.selectionModel().selectionChanged.connect(self.on_table_select)
 
         content.addWidget(self.table, 2)
 
@@ -540,7 +694,10 @@ class HistoryDialog(QtWidgets.QDialog):
         if HAS_MPL:
             self.fig = Figure(figsize=(4, 3))
             self.canvas = FigureCanvas(self.fig)
+            # zoom/pan tools; the visible range is re-downsampled after each change
+            right_panel.addWidget(NavigationToolbar(self.canvas, self))
             right_panel.addWidget(self.canvas, 3)
+            self._init_chart()
         else:
             self.canvas = None
             self.no_chart_label = QtWidgets.QLabel('matplotlib not installed — install matplotlib to see charts')
@@ -552,14 +709,31 @@ class HistoryDialog(QtWidgets.QDialog):
         self.summary_label.setWordWrap(True)
         right_panel.addWidget(self.summary_label, 1)
 
+        # per-room statistics of the selected metric over the selected range
+        self.room_stats_note = QtWidgets.QLabel()
+        self.room_stats_note.setWordWrap(True)
+        self.room_stats_note.setVisible(False)
+        right_panel.addWidget(self.room_stats_note)
+        self.room_stats = QtWidgets.QTableWidget(0, len(ROOM_STATS_COLUMNS))
+        self.room_stats.setHorizontalHeaderLabels([header for header, _key in ROOM_STATS_COLUMNS])
+        self.room_stats.verticalHeader().setVisible(False)
+        self.room_stats.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.room_stats.setVisible(HAS_NUMPY)
+        right_panel.addWidget(self.room_stats, 1)
+        # they are computed by RoomStatsWorker threads; only the newest one's result is shown
+        self._stats_workers = []
+        self._stats_current = None
+        # the table only lists messages of the selected sensor, so a new one means a new query
+        self.metric_combo.currentIndexChanged.connect(self.load_data)
+
         content.addLayout(right_panel, 1)
         layout.addLayout(content, 1)
 
         # Bottom controls: export, close
         btns = QtWidgets.QHBoxLayout()
         btns.addStretch()
-        self.btn_export = QtWidgets.QPushButton('Export CSV')
-        self.btn_export.clicked.connect(self.export_csv)
+        self.btn_export = QtWidgets.QPushButton('Export...')
+        self.btn_export.clicked.connect(self.open_export)
         btns.addWidget(self.btn_export)
 
         self.btn_close = QtWidgets.QPushButton('Close')
@@ -570,139 +744,439 @@ class HistoryDialog(QtWidgets.QDialog):
         # load initial data
         self.load_data()
 
-    def load_data(self):
+    def _set_range_edits(self):
+        # a preset range ends now, so it moves forward on every refresh
+        _label, seconds = TIME_RANGES[self.range_combo.currentIndex()]
+        now = QtCore.QDateTime.currentDateTime()
+        for edit, value in ((self.from_edit, self.from_edit.minimumDateTime() if seconds is None
+                             else now.addSecs(-seconds)), (self.to_edit, now)):
+            edit.blockSignals(True)
+            edit.setDateTime(value)
+            edit.blockSignals(False)
+
+    def on_range_changed(self, index):
+        if index != CUSTOM_RANGE:
+            self.load_data()
+
+    def on_range_edited(self, *args):
+        self.range_combo.blockSignals(True)
+        self.range_combo.setCurrentIndex(CUSTOM_RANGE)
+        self.range_combo.blockSignals(False)
+        self._filter_timer.start()
+
+    def filters(self):
+        """(room_ids, since_ms, until_ms) of the current selection."""
+        since = self.from_edit.dateTime()
+        since_ms = None if since == self.from_edit.minimumDateTime() else since.toMSecsSinceEpoch()
+        return self.room_combo.currentData(), since_ms, self.to_edit.dateTime().toMSecsSinceEpoch()
+
+    def load_data(self, *args):
+        self._filter_timer.stop()
+        if self.range_combo.currentIndex() != CUSTOM_RANGE:
+            self._set_range_edits()
+        metric = self.metric_combo.currentText()
+        room_ids, since_ms, until_ms = self.filters()
+
+        # statistics come from the rollup tables, so they cover the whole range, not just the rows shown;
+        # the rollups keep readings of no room under room 0
+        room_id = None if room_ids is None else room_ids[0] or 0
         conn = sqlite3.connect(self.db_path)
         try:
-            c = conn.cursor()
-            limit = int(self.limit_spin.value()) if hasattr(self, 'limit_spin') else 500
-            c.execute('SELECT id, ts, topic, payload FROM messages ORDER BY id DESC LIMIT ?', (limit,))
-            rows = c.fetchall()
+            stats = storage.rollup_stats(conn, since_ms, room_id, until_ms)
         finally:
             conn.close()
 
-        # populate table
-        self.table.setRowCount(len(rows))
-
-        temps = []
-        hums = []
-        luxes = []
+        # the table pages itself in from the DB
+        self.model.set_filter(metric, room_ids, since_ms, until_ms)
+        self.model.reload()
 
-        for rindex, row in enumerate(rows):
-            _id, ts, topic, payload = row
-            # parse payload
-            temp = hum = lux = ''
-            try:
-                data = json.loads(payload)
-                if isinstance(data, dict):
-                    if 'temperature' in data:
-                        temp = str(data.get('temperature'))
-                        try:
-                            temps.append(float(data.get('temperature')))
-                        except Exception:
-                            pass
-                    if 'humidity' in data:
-                        hum = str(data.get('humidity'))
-                        try:
-                            hums.append(float(data.get('humidity')))
-                        except Exception:
-                            pass
-                    if 'lux' in data:
-                        lux = str(data.get('lux'))
-                        try:
-                            luxes.append(float(data.get('lux')))
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-
-            cells = [str(_id), ts, topic, temp, hum, lux, payload]
-            for cidx, val in enumerate(cells):
-                item = QtWidgets.QTableWidgetItem(val)
-                item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-                item.setForeground(QtCore.Qt.white)
-                self.table.setItem(rindex, cidx, item)
-
-        # compute stats
-        def stats(arr):
-            if not arr:
+        def fmt_stats(sensor):
+            if sensor not in stats:
                 return 'n/a'
-            return f'count={len(arr)} min={min(arr):.2f} max={max(arr):.2f} avg={sum(arr)/len(arr):.2f}'
+            count, vmin, vmax, avg = stats[sensor]
+            return f'count={count} min={vmin:.2f} max={vmax:.2f} avg={avg:.2f}'
 
-        summary = f"Temperature: {stats(temps)}\nHumidity: {stats(hums)}\nLight (lux): {stats(luxes)}\nRows shown: {len(rows)}"
+        summary = (f"{self.room_combo.currentText()}, {self.range_combo.currentText().lower()}"
+                   f"\nTemperature: {fmt_stats('temperature')}\nHumidity: {fmt_stats('humidity')}"
+                   f"\nLight (lux): {fmt_stats('lux')}\nRows loaded: {self.model.rowCount()}")
         self.summary_label.setText(summary)
+        self.load_room_stats()
 
         # update chart
+        self.series.load(int(self.limit_spin.value()), room_ids, since_ms, until_ms)
         if HAS_MPL:
             self.plot_metric()
 
-    def export_csv(self):
-        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export CSV', 'history.csv', 'CSV Files (*.csv)')
-        if not path:
+    def load_room_stats(self, *args):
+        # raw readings of one metric, reduced per room with NumPy on a worker thread
+        if not HAS_NUMPY:
+            return
+        for worker in self._stats_workers:
+            # superseded, stop between rooms
+            worker.requestInterruption()
+        metric = self.metric_combo.currentText()
+        worker = RoomStatsWorker(self.db_path, metric, *self.filters(), self.thresholds.get(metric), parent=self)
+        worker.done.connect(self.show_room_stats)
+        worker.finished.connect(self._stats_worker_finished)
+        self._stats_workers.append(worker)
+        self._stats_current = worker
+        self.room_stats.setEnabled(False)
+        worker.start()
+
+    def _stats_worker_finished(self):
+        worker = self.sender()
+        if worker in self._stats_workers:
+            self._stats_workers.remove(worker)
+        worker.deleteLater()
+
+    def show_room_stats(self, stats, raw_start_ms):
+        if self.sender() is not self._stats_current:
+            # the filters changed while this one was running
             return
+        if raw_start_ms is None:
+            self.room_stats_note.setVisible(False)
+        else:
+            # unlike the summary above, these come from raw readings, which retention expires first
+            start = QtCore.QDateTime.fromMSecsSinceEpoch(raw_start_ms).toString('yyyy-MM-dd HH:mm')
+            self.room_stats_note.setText(f'Per-room statistics from {start} on, older raw readings have expired')
+            self.room_stats_note.setVisible(True)
+        self.room_stats.setEnabled(True)
+        self.room_stats.setRowCount(len(stats))
+        for r, (room_id, row) in enumerate(sorted(stats.items())):
+            name = room_config.get_room_name(room_id) or 'Unassigned'
+            self.room_stats.setItem(r, 0, QtWidgets.QTableWidgetItem(name))
+            for c, (_header, key) in enumerate(ROOM_STATS_COLUMNS[1:], start=1):
+                value = row.get(key)
+                if value is None or value != value:
+                    # missing, or NaN (rate of a room with a single reading)
+                    text = ''
+                elif key == 'count':
+                    text = str(value)
+                else:
+                    text = f'{value:.2f}'
+                self.room_stats.setItem(r, c, QtWidgets.QTableWidgetItem(text))
+        self.room_stats.resizeColumnsToContents()
+
+    def done(self, result):
+        # a worker thread must not outlive the dialog that owns it
+        for worker in self._stats_workers:
+            worker.requestInterruption()
+        for worker in self._stats_workers:
+            worker.wait()
+        super().done(result)
+
+    def open_export(self):
+        dlg = ExportDialog(self, self.db_path)
+        dlg.exec_()
 
-        # read current table and write
-        with open(path, 'w', encoding='utf-8') as f:
-            # header
-            headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-            f.write(','.join(headers) + '\n')
-            for r in range(self.table.rowCount()):
-                vals = []
-                for c in range(self.table.columnCount()):
-                    item = self.table.item(r, c)
-                    vals.append('"' + (item.text().replace('"', '""') if item else '') + '"')
-                f.write(','.join(vals) + '\n')
-        QtWidgets.QMessageBox.information(self, 'Export', f'Exported {self.table.rowCount()} rows to {path}')
-
-    def on_table_select(self):
-        # when a row is selected, update chart to show topic-specific series
+    def on_table_select(self, *args):
+        # highlight the selected message on the chart; served from the caches, no DB access
         if not HAS_MPL:
             return
-        self.plot_metric()
+        rows = self.table.selectionModel().selectedRows()
+        pos = None
+        if rows:
+            row = self.model.raw_row(rows[0].row())
+            if row is not None:
+                # the reading's ts, appended to each row by storage.fetch_sensor_messages
+                pos = self.series.position(self.metric_combo.currentText(), row[7])
+        if pos is None:
+            self._marker.set_data([], [])
+        else:
+            _ts, vals = self.series.get(self.metric_combo.currentText())
+            self._marker.set_data([pos], [vals[pos]])
+        self._blit_marker()
+
+    def _init_chart(self):
+        # the axes and artists are created once and updated in place
+        self.ax = self.fig.add_subplot(111)
+        self.ax.grid(True, color='#122027')
+        self._line, = self.ax.plot([], [], '-', color='#0f9f9a')
+        self._marker, = self.ax.plot([], [], 'o', color='#ff6b6b', markersize=10, animated=True)
+        self._no_data = self.ax.text(0.5, 0.5, 'No data for metric', ha='center', va='center',
+                                     color='white', transform=self.ax.transAxes, visible=False)
+        self._background = None
+        # full-resolution series of the current metric; the line only ever gets a downsampled copy
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        # zooming/panning fires many xlim changes, resample once things settle
+        self._resample_timer = QtCore.QTimer(self)
+        self._resample_timer.setSingleShot(True)
+        self._resample_timer.setInterval(50)
+        self._resample_timer.timeout.connect(self._resample_view)
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self._resample_timer.start())
+
+    def _on_draw(self, event):
+        # cache the static part of the chart so the marker can be blitted over it
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self._marker)
+
+    def _blit_marker(self):
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self._marker)
+        self.canvas.blit(self.ax.bbox)
+
+    def _resample_view(self):
+        # downsample only the visible range, to roughly one point per pixel column
+        if not len(self._x):
+            return
+        xmin, xmax = self.ax.get_xlim()
+        lo = max(int(np.searchsorted(self._x, xmin)) - 1, 0)
+        hi = min(int(np.searchsorted(self._x, xmax)) + 1, len(self._x))
+        xs, ys = lttb(self._x[lo:hi], self._y[lo:hi], max(int(self.ax.bbox.width), 100))
+        self._line.set_data(xs, ys)
+        # markers only make sense while individual samples can be told apart
+        self._line.set_marker('o' if len(xs) <= 200 else '')
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+        self.canvas.draw_idle()
 
     def plot_metric(self):
         metric = self.metric_combo.currentText()
-        # fetch recent metric values for plotting
-        conn = sqlite3.connect(self.db_path)
-        try:
-            c = conn.cursor()
-            c.execute('SELECT ts, payload FROM messages ORDER BY id DESC LIMIT ?', (int(self.limit_spin.value()),))
-            rows = c.fetchall()
-        finally:
-            conn.close()
+        _ts, vals = self.series.get(metric)
+        self._y = np.frombuffer(vals, dtype=np.float64) if vals else np.empty(0)
+        self._x = np.arange(len(self._y), dtype=np.float64)
+        self._marker.set_data([], [])
+        self._no_data.set_visible(not vals)
+        if vals:
+            source = ', in memory' if metric in self.series.from_memory else ''
+            self.ax.set_title(f'{metric} (last {len(vals)} samples{source})')
+            self.ax.set_xlim(0, max(len(vals) - 1, 1))
+            self._resample_view()
+            self._resample_timer.stop()
+        else:
+            self._line.set_data([], [])
+            self.ax.set_title('')
+            self.canvas.draw_idle()
+
+
+class RoomStatsWorker(QtCore.QThread):
+    """Loads one sensor's readings and reduces them per room (reading_stats)
+    off the GUI thread; emits done({room_id: stats}, raw_start_ms), or an
+    empty dict when interrupted or the query fails. raw_start_ms is set when
+    retention has expired the raw readings of part of the range (see
+    storage.raw_readings_start), else None."""
+    done = QtCore.pyqtSignal(object, object)
 
-        times = []
-        vals = []
-        # rows are newest first -> reverse for time order
-        for ts, payload in reversed(rows):
+    def __init__(self, db_path, sensor, room_ids, since_ms, until_ms, threshold, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.sensor = sensor
+        self.room_ids = room_ids
+        self.since_ms = since_ms
+        self.until_ms = until_ms
+        self.threshold = threshold
+
+    def run(self):
+        stats = {}
+        raw_start_ms = None
+        try:
+            conn = sqlite3.connect(self.db_path)
             try:
-                data = json.loads(payload)
-                if isinstance(data, dict) and metric in data:
-                    v = float(data.get(metric))
-                    vals.append(v)
-                    # try parse ts as ISO
-                    try:
-                        times.append(datetime.fromisoformat(ts))
-                    except Exception:
-                        times.append(ts)
-            except Exception:
-                pass
-
-        self.fig.clear()
-        ax = self.fig.add_subplot(111)
-        if vals:
-            ax.plot(vals, '-o', color='#0f9f9a')
-            ax.set_title(f'{metric} (last {len(vals)} samples)')
-            ax.grid(True, color='#122027')
+                columns = reading_stats.load_sensor(conn, self.sensor, self.since_ms, self.until_ms, self.room_ids,
+                                                    cancelled=self.isInterruptionRequested)
+                raw_start_ms = storage.raw_readings_start(conn, self.sensor)
+            finally:
+                conn.close()
+            if raw_start_ms is not None and self.since_ms is not None and raw_start_ms <= self.since_ms:
+                # the range is still fully covered
+                raw_start_ms = None
+            if columns is not None:
+                stats = reading_stats.group_stats(*columns, threshold=self.threshold, presorted=True)
+        except Exception:
+            # nothing to show; the summary above comes from the rollups and still loads
+            pass
+        self.done.emit(stats, raw_start_ms)
+
+
+class ExportWorker(QtCore.QThread):
+    """Runs exporter.export() off the GUI thread; requestInterruption() cancels it."""
+    progress = QtCore.pyqtSignal(object, object)
+    done = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, db_path, path, fmt, since_ms, until_ms, room_ids, sensors, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.path = path
+        self.fmt = fmt
+        self.since_ms = since_ms
+        self.until_ms = until_ms
+        self.room_ids = room_ids
+        self.sensors = sensors
+
+    def run(self):
+        try:
+            rows = exporter.export(self.db_path, self.path, self.fmt, self.since_ms, self.until_ms,
+                                   self.room_ids, self.sensors, progress=self.progress.emit,
+                                   cancelled=self.isInterruptionRequested)
+        except exporter.ExportCancelled:
+            self.failed.emit('Export cancelled')
+        except Exception as e:
+            # anything else too: the dialog only leaves its running state on done/failed
+            self.failed.emit(f'Export failed: {e}')
         else:
-            ax.text(0.5, 0.5, 'No data for metric', ha='center', va='center', color='white')
-        self.canvas.draw()
+            self.done.emit(rows)
+
+
+class ExportDialog(QtWidgets.QDialog):
+    """Time range, room, sensor and format of an export, with progress and cancel.
+    Rows are streamed from the database by an ExportWorker, not taken from the table."""
+
+    def __init__(self, parent=None, db_path='sensor_data.db'):
+        super().__init__(parent)
+        self.setWindowTitle('Export readings')
+        self.db_path = db_path
+        self.worker = None
+
+        form = QtWidgets.QFormLayout()
+        now = QtCore.QDateTime.currentDateTime()
+        self.from_edit = QtWidgets.QDateTimeEdit(now.addDays(-7))
+        self.to_edit = QtWidgets.QDateTimeEdit(now)
+        for edit in (self.from_edit, self.to_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat('yyyy-MM-dd HH:mm')
+        form.addRow('From:', self.from_edit)
+        form.addRow('To:', self.to_edit)
+
+        self.room_combo = make_room_combo()
+        form.addRow('Room:', self.room_combo)
+
+        self.sensor_combo = QtWidgets.QComboBox()
+        self.sensor_combo.addItem('All sensors', None)
+        for sensor in payloads.METRIC_KEYS:
+            self.sensor_combo.addItem(sensor, [sensor])
+        form.addRow('Sensor:', self.sensor_combo)
+
+        self.format_combo = QtWidgets.QComboBox()
+        for fmt in exporter.FORMATS:
+            self.format_combo.addItem(fmt.upper(), fmt)
+        form.addRow('Format:', self.format_combo)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(form)
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+        self.status_label = QtWidgets.QLabel('')
+        layout.addWidget(self.status_label)
+
+        btns = QtWidgets.QHBoxLayout()
+        btns.addStretch()
+        self.btn_start = QtWidgets.QPushButton('Export...')
+        self.btn_start.clicked.connect(self.start_export)
+        btns.addWidget(self.btn_start)
+        self.btn_cancel = QtWidgets.QPushButton('Close')
+        self.btn_cancel.clicked.connect(self.reject)
+        btns.addWidget(self.btn_cancel)
+        layout.addLayout(btns)
+
+    def start_export(self):
+        fmt = self.format_combo.currentData()
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export readings', f'readings.{fmt}',
+                                                        exporter.FORMATS[fmt])
+        if not path:
+            return
+        since_ms = self.from_edit.dateTime().toMSecsSinceEpoch()
+        until_ms = self.to_edit.dateTime().toMSecsSinceEpoch()
+        self.worker = ExportWorker(self.db_path, path, fmt, since_ms, until_ms,
+                                   self.room_combo.currentData(), self.sensor_combo.currentData(), self)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.done.connect(lambda rows: self.on_finished(f'Exported {rows} readings to {path}'))
+        self.worker.failed.connect(self.on_finished)
+        self.worker.finished.connect(self.on_worker_finished)
+        self._set_running(True)
+        self.status_label.setText('Counting readings...')
+        self.worker.start()
+
+    def _set_running(self, running):
+        for widget in (self.from_edit, self.to_edit, self.room_combo, self.sensor_combo,
+                       self.format_combo, self.btn_start):
+            widget.setEnabled(not running)
+        self.btn_cancel.setText('Cancel' if running else 'Close')
+
+    def on_progress(self, done, total):
+        # percent rather than rows, QProgressBar's range is a C int
+        self.progress_bar.setValue(int(done * 100 / total) if total else 100)
+        self.status_label.setText(f'{done} / {total} readings')
+
+    def on_finished(self, text):
+        self.worker = None
+        self._set_running(False)
+        self.status_label.setText(text)
+
+    def on_worker_finished(self):
+        # done/failed arrive before finished; still running here means the thread died without either
+        if self.sender() is self.worker:
+            self.on_finished('Export stopped unexpectedly')
+
+    def reject(self):
+        # Cancel (or Esc / closing the window) while running stops the export;
+        # the dialog stays open until the worker has cleaned up
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            return
+        super().reject()
+
+
+# GUI thread methods timed by --profile; LogConsole.flush is where append_log's text actually lands
+PROFILED = [
+    (DataManagerApp, ('on_message_gui', 'update_display')),
+    (HistoryDialog, ('load_data', 'plot_metric')),
+    (LogConsole, ('flush',)),
+]
+
+
+def start_profiling(mode):
+    """Wrap the PROFILED methods; mode 'cprofile' also records a cProfile.
+    Must run before any window is created, signals connect to the wrappers."""
+    profiler = profiling.Profiler(cprofile=mode == 'cprofile')
+    for cls, names in PROFILED:
+        profiler.instrument(cls, *names)
+    return profiler
 
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
-    win = DataManagerApp()
+    parser = argparse.ArgumentParser(description='Smart home data manager GUI.')
+    parser.add_argument('--viewer', action='store_true',
+                        help='only browse the database; ingest is done by ingest_service.py')
+    parser.add_argument('--log-level', choices=['debug', 'info'],
+                        default=os.environ.get('DATA_MANAGER_LOG_LEVEL', 'info').lower(),
+                        help='console verbosity (default: $DATA_MANAGER_LOG_LEVEL or info)')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    # DATA_MANAGER_PROFILE=1 is short for timing, unset/empty/0 for off
+    profile_modes = ['off', 'timing', 'cprofile']
+    env_profile = os.environ.get('DATA_MANAGER_PROFILE', '').lower()
+    env_profile = {'': 'off', '0': 'off', '1': 'timing'}.get(env_profile, env_profile)
+    parser.add_argument('--profile', nargs='?', const='timing', choices=profile_modes, default=env_profile,
+                        help='time the GUI hot paths and write a report on exit; cprofile adds a call '
+                             'breakdown (default: $DATA_MANAGER_PROFILE or off)')
+    parser.add_argument('--profile-out', default='profile_report.txt', metavar='FILE',
+                        help='where --profile writes its report (default: profile_report.txt)')
+    retention.add_arguments(parser)
+    # leave Qt's own options (e.g. -style) to QApplication
+    args, qt_args = parser.parse_known_args()
+    # argparse doesn't check defaults against choices
+    if args.profile not in profile_modes:
+        parser.error(f'DATA_MANAGER_PROFILE: invalid choice: {args.profile!r} '
+                     f'(choose from 0, 1, {", ".join(profile_modes)})')
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    level = log_console.DEBUG if args.log_level == 'debug' else log_console.INFO
+    # when off nothing is wrapped, the methods run exactly as written
+    profiler = start_profiling(args.profile) if args.profile != 'off' else None
+    win = DataManagerApp(viewer=args.viewer, log_level=level, metrics_port=args.metrics_port,
+                         ingest_options=retention.ingest_options(args))
     win.show()
-    sys.exit(app.exec_())
+    code = app.exec_()
+    if profiler:
+        profiler.report(args.profile_out, 'data_manager.py profile')
+        print(f'Profile written to {os.path.abspath(args.profile_out)}')
+    sys.exit(code)
 
 
 if __name__ == '__main__':
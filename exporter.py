@@ -0,0 +1,191 @@
+"""Streaming export of the readings table, read from SQLite in chunks so
+the size of an export is not limited by memory. Safe to run off the GUI thread."""
+import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+from array import array
+from datetime import datetime
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+import payloads
+import room_config
+
+
+# format -> file dialog filter; NPZ is only offered when NumPy can read it back
+FORMATS = {'csv': 'CSV Files (*.csv)'}
+if HAS_NUMPY:
+    FORMATS['npz'] = 'NumPy archive (*.npz)'
+
+CSV_HEADER = ['ts_ms', 'time', 'room', 'sensor', 'value']
+
+# rows fetched from SQLite per step; progress and cancel are checked in between
+CHUNK = 20000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def _series(room_ids, sensors):
+    # exported one (room, sensor) series at a time, each an ordered range
+    # of the (room_id, sensor, ts) index; None is the unassigned room
+    if room_ids is None:
+        room_ids = [r["room_id"] for r in room_config.ROOMS.values()] + [None]
+    if sensors is None:
+        sensors = list(payloads.METRIC_KEYS)
+    return [(room_id, sensor) for room_id in room_ids for sensor in sensors]
+
+
+def _where(since_ms, until_ms):
+    sql = ' FROM readings WHERE room_id IS ? AND sensor = ? AND ts >= ? AND ts < ?'
+    return sql, [since_ms or 0, int(time.time() * 1000) if until_ms is None else until_ms]
+
+
+def count_readings(conn, since_ms=None, until_ms=None, room_ids=None, sensors=None):
+    """Number of readings export() would write; counted on the index only."""
+    where, extra = _where(since_ms, until_ms)
+    return sum(conn.execute('SELECT COUNT(*)' + where, [room_id, sensor] + extra).fetchone()[0]
+               for room_id, sensor in _series(room_ids, sensors))
+
+
+def iter_chunks(conn, since_ms=None, until_ms=None, room_ids=None, sensors=None, chunk=CHUNK):
+    """Yield (room_id, sensor, rows) with rows a list of at most `chunk`
+    (ts, value) tuples, ordered by room, sensor and time."""
+    where, extra = _where(since_ms, until_ms)
+    for room_id, sensor in _series(room_ids, sensors):
+        cur = conn.execute('SELECT ts, value' + where + ' ORDER BY ts', [room_id, sensor] + extra)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            yield room_id, sensor, rows
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.out = csv.writer(self.file)
+        self.out.writerow(CSV_HEADER)
+        self._minute = None
+        self._prefix = ''
+
+    def _time(self, ts):
+        # local time with milliseconds; UTC offsets only change on whole
+        # minutes, so the 'YYYY-MM-DDTHH:MM:' part is formatted once per minute
+        minute, ms = divmod(ts, 60000)
+        if minute != self._minute:
+            self._minute = minute
+            self._prefix = datetime.fromtimestamp(minute * 60).isoformat()[:17]
+        return f'{self._prefix}{ms // 1000:02d}.{ms % 1000:03d}'
+
+    def write(self, room_id, sensor, rows):
+        room = room_config.get_room_name(room_id) or ''
+        fmt_time = self._time
+        self.out.writerows((ts, fmt_time(ts), room, sensor, value) for ts, value in rows)
+
+    def close(self):
+        self.file.close()
+
+    discard = close
+
+
+class _NpzWriter:
+    """Columns ts (int64 ms), room_id (int64, 0 = unassigned), sensor (int8
+    index into sensor_names) and value (float64), plus lookup arrays
+    room_ids/room_names. Each column is appended to its own temporary file
+    and copied into the .npy members of the archive at the end."""
+
+    COLUMNS = (('ts', '<i8'), ('room_id', '<i8'), ('sensor', '|i1'), ('value', '<f8'))
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path)))
+        self.files = {name: open(os.path.join(self.tmp.name, name), 'wb') for name, _descr in self.COLUMNS}
+        self.sensors = {}
+        self.count = 0
+
+    def write(self, room_id, sensor, rows):
+        code = self.sensors.setdefault(sensor, len(self.sensors))
+        n = len(rows)
+        array('q', [ts for ts, _value in rows]).tofile(self.files['ts'])
+        (array('q', [room_id or 0]) * n).tofile(self.files['room_id'])
+        (array('b', [code]) * n).tofile(self.files['sensor'])
+        array('d', [value for _ts, value in rows]).tofile(self.files['value'])
+        self.count += n
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        rooms = sorted((r["room_id"], name) for name, r in room_config.ROOMS.items())
+        lookups = {
+            'sensor_names': np.array(list(self.sensors), dtype=str),
+            'room_ids': np.array([0] + [room_id for room_id, _name in rooms], dtype=np.int64),
+            'room_names': np.array(['Unassigned'] + [name for _room_id, name in rooms], dtype=str),
+        }
+        try:
+            with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+                for name, descr in self.COLUMNS:
+                    with zf.open(name + '.npy', 'w', force_zip64=True) as member:
+                        np.lib.format.write_array_header_1_0(
+                            member, {'descr': descr, 'fortran_order': False, 'shape': (self.count,)})
+                        with open(os.path.join(self.tmp.name, name), 'rb') as column:
+                            shutil.copyfileobj(column, member, 1024 * 1024)
+                for name, values in lookups.items():
+                    with zf.open(name + '.npy', 'w') as member:
+                        np.lib.format.write_array(member, values)
+        finally:
+            self.tmp.cleanup()
+
+    def discard(self):
+        for f in self.files.values():
+            f.close()
+        self.tmp.cleanup()
+
+
+def export(db_path, path, fmt='csv', since_ms=None, until_ms=None, room_ids=None, sensors=None,
+           progress=None, cancelled=None, chunk=CHUNK):
+    """Write the matching readings to `path` and return how many were written.
+
+    since_ms/until_ms bound the reading time (until defaults to now, so rows
+    arriving during the export don't extend it), room_ids and sensors
+    restrict the series (None = all). progress(done, total) is called after
+    every chunk; when cancelled() returns true the export stops, the partial
+    file is removed and ExportCancelled is raised. The file is written
+    under a temporary name and only renamed to `path` once complete."""
+    if fmt not in FORMATS:
+        raise ValueError(f'unsupported export format: {fmt}')
+    if until_ms is None:
+        until_ms = int(time.time() * 1000)
+    part = path + '.part'
+    conn = sqlite3.connect(db_path)
+    try:
+        total = count_readings(conn, since_ms, until_ms, room_ids, sensors)
+        writer = _CsvWriter(part) if fmt == 'csv' else _NpzWriter(part)
+        done = 0
+        try:
+            for room_id, sensor, rows in iter_chunks(conn, since_ms, until_ms, room_ids, sensors, chunk):
+                if cancelled and cancelled():
+                    raise ExportCancelled()
+                writer.write(room_id, sensor, rows)
+                done += len(rows)
+                if progress:
+                    progress(done, total)
+            writer.close()
+        except BaseException:
+            writer.discard()
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+    finally:
+        conn.close()
+    os.replace(part, path)
+    return done
@@ -0,0 +1,209 @@
+import bisect
+import sqlite3
+from array import array
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+
+import payloads
+import room_config
+import storage
+
+
+HEADERS = ['id', 'ts', 'topic', 'temperature', 'humidity', 'lux', 'payload']
+
+_WHITE = QtGui.QBrush(QtCore.Qt.white)
+
+
+def _fmt_value(v):
+    return '' if v is None else f'{v:g}'
+
+
+class MessageTableModel(QtCore.QAbstractTableModel):
+    """Read-only, lazily paged view of the messages table (newest first).
+
+    The view grows through canFetchMore/fetchMore as the user scrolls. Only
+    the boundary of each page is remembered; the rows themselves live in
+    a small LRU page cache and are re-read from SQLite when scrolled back
+    into view, so memory stays flat however far the user scrolls."""
+
+    def __init__(self, db_path, page_size=500, max_pages=8, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._bounds = []      # paging cursor used to fetch each page
+        self._pages = OrderedDict()
+        self._row_count = 0
+        self._exhausted = False
+        # set_filter(): only messages with a reading of `sensor` in these rooms and range
+        self.sensor = None
+        self.room_ids = None
+        self.since_ms = None
+        self.until_ms = None
+
+    def set_filter(self, sensor=None, room_ids=None, since_ms=None, until_ms=None):
+        """Restrict the rows to messages with a `sensor` reading (None = all
+        messages); takes effect on the next reload()."""
+        self.sensor = sensor
+        self.room_ids = room_ids
+        self.since_ms = since_ms
+        self.until_ms = until_ms
+
+    def reload(self):
+        self.beginResetModel()
+        self._bounds = []
+        self._pages.clear()
+        self._row_count = 0
+        self._exhausted = False
+        self.endResetModel()
+        # prime the first page so the view has something to show
+        self.fetchMore(QtCore.QModelIndex())
+
+    # --- paging ---
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._exhausted:
+            return
+        before = None
+        if self._bounds:
+            last_page = self._load_page(len(self._bounds) - 1)
+            if len(last_page) < self.page_size:
+                self._exhausted = True
+                return
+            # filtered rows page on the (ts, id) of their reading, see fetch_sensor_messages
+            before = last_page[-1][0] if self.sensor is None else last_page[-1][7:9]
+        rows = self._query(before)
+        if not rows:
+            self._exhausted = True
+            return
+        page = len(self._bounds)
+        self.beginInsertRows(QtCore.QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+        self._bounds.append(before)
+        self._cache_page(page, rows)
+        self._row_count += len(rows)
+        self.endInsertRows()
+        if len(rows) < self.page_size:
+            self._exhausted = True
+
+    def _query(self, before):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if self.sensor is None:
+                return storage.fetch_recent_messages(conn, self.page_size, before)
+            return storage.fetch_sensor_messages(conn, self.sensor, self.page_size, before,
+                                                 self.room_ids, self.since_ms, self.until_ms)
+        finally:
+            conn.close()
+
+    def _cache_page(self, page, rows):
+        self._pages[page] = rows
+        self._pages.move_to_end(page)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _load_page(self, page):
+        rows = self._pages.get(page)
+        if rows is None:
+            rows = self._query(self._bounds[page])
+            self._cache_page(page, rows)
+        else:
+            self._pages.move_to_end(page)
+        return rows
+
+    def raw_row(self, row):
+        """(id, ts, topic, temperature, humidity, lux, payload) for a view row."""
+        page, offset = divmod(row, self.page_size)
+        rows = self._load_page(page)
+        # rows removed since the page was first read leave a short page behind
+        return rows[offset] if offset < len(rows) else None
+
+    # --- model interface ---
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            row = self.raw_row(index.row())
+            if row is None:
+                return ''
+            # cells are formatted only when the view asks for them
+            col = index.column()
+            if col == 0:
+                return str(row[0])
+            if 3 <= col <= 5:
+                return _fmt_value(row[col])
+            if col == 6:
+                return payloads.to_text(row[6])
+            return row[col]
+        if role == QtCore.Qt.ForegroundRole:
+            return _WHITE
+        return None
+
+
+class SeriesCache:
+    """Columnar copy of the most recent readings per sensor, loaded once per
+    refresh and shared by everything in the history dialog that needs a series.
+
+    With `recent` (the ingest's recent_history.RecentHistory) a single room
+    whose in-memory buffer reaches back to the start of the range is served
+    from memory instead of the database."""
+
+    def __init__(self, db_path, sensors=('temperature', 'humidity', 'lux'), recent=None):
+        self.db_path = db_path
+        self.sensors = sensors
+        self.recent = recent
+        self._series = {}
+        # sensors of the last load() that came from memory
+        self.from_memory = set()
+
+    def load(self, limit, room_ids=None, since_ms=None, until_ms=None):
+        self.from_memory.clear()
+        conn = None
+        try:
+            for sensor in self.sensors:
+                series = self._from_memory(sensor, limit, room_ids, since_ms, until_ms)
+                if series is not None:
+                    self.from_memory.add(sensor)
+                else:
+                    if conn is None:
+                        conn = sqlite3.connect(self.db_path)
+                    rows = storage.fetch_series(conn, sensor, limit, room_ids, since_ms, until_ms)
+                    series = array('q', (r[1] for r in rows)), array('d', (r[2] for r in rows))
+                self._series[sensor] = series
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _from_memory(self, sensor, limit, room_ids, since_ms, until_ms):
+        if self.recent is None or room_ids is None or len(room_ids) != 1:
+            return None
+        room = room_config.get_room_name(room_ids[0])
+        if room is None or not self.recent.covers(room, sensor, since_ms):
+            return None
+        ts, values = self.recent.window(room, sensor, since_ms=since_ms, until_ms=until_ms)
+        return ts[-limit:], values[-limit:]
+
+    def get(self, sensor):
+        """(ts, values) arrays for a sensor, oldest first."""
+        return self._series.get(sensor) or (array('q'), array('d'))
+
+    def position(self, sensor, ts):
+        """Position of the reading taken at `ts` (epoch ms) in a sensor's series, or None."""
+        tss = self.get(sensor)[0]
+        i = bisect.bisect_left(tss, ts)
+        return i if i < len(tss) and tss[i] == ts else None
@@ -0,0 +1,251 @@
+"""Headless ingest: subscribe -> parse -> route -> persist -> alarm, no Qt required.
+
+Run it as a long-lived collector next to (or instead of) the GUI:
+    python ingest_service.py [--db sensor_data.db] [--verbose]
+The GUI can then be started with `python data_manager.py --viewer` to browse
+the same database without ingesting a second copy.
+"""
+import argparse
+import math
+import signal
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import metrics
+import mqtt_init
+from mqtt_init import client_init, send_msg
+import payloads
+import room_config
+import storage
+from alarms import AlarmEngine
+from recent_history import RecentHistory
+import retention
+from retention import RAW_DAYS, RetentionJob
+
+
+# One parsed MQTT message as handed to listeners
+Message = namedtuple('Message', 'topic payload room sensor data values')
+
+
+def _print_log(text):
+    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    print(f'[{ts}] {text}', flush=True)
+
+
+class IngestService:
+    """Owns the MQTT client and the DB writer.
+
+    Messages are handled on the paho network thread. Listeners are plain
+    callables; a GUI that registers one must hand the message over to its
+    own thread (the data manager does this with a Qt signal)."""
+
+    def __init__(self, db_path=storage.DB_PATH, client_name='Ingest-', log=None, verbose=False,
+                 retention=False, raw_days=RAW_DAYS, archive_dir=None, alarm_hold=0.0, registry=None):
+        self.db_path = db_path
+        self.client_name = client_name
+        self.log = log or _print_log
+        self.verbose = verbose
+        self.client = None
+        self.connected = False
+        # the last few hours of every series in memory, see recent_history.py
+        self.recent = RecentHistory()
+        self.alarms = AlarmEngine(hold=alarm_hold, recent=self.recent)
+        # shared with the engine, so edits take effect on the next reading
+        self.thresholds = self.alarms.thresholds
+        self.listeners = []        # called with every Message
+        self.alarm_listeners = []  # called with every alarms.AlarmEvent
+        self.status_listeners = []  # called with (connected, text) when the connection changes
+        # see metrics.py; the writer reports DB timings to the same registry
+        self.registry = metrics.REGISTRY if registry is None else registry
+        self._messages = self.registry.counter('smarthome_messages_total', 'MQTT messages handled')
+        self._parse_failures = self.registry.counter('smarthome_parse_failures_total',
+                                                     'Messages whose payload could not be decoded')
+        self._handle_time = self.registry.histogram('smarthome_handle_seconds',
+                                                    'Parse, queue, notify and alarm check of one message')
+        self._alarm_count = self.registry.counter('smarthome_alarms_total', 'Alarm events (raised and cleared)')
+        self._received_bytes = self.registry.counter('smarthome_mqtt_received_bytes_total', 'MQTT payload bytes')
+        self._connects = self.registry.counter('smarthome_mqtt_connects_total', 'Accepted broker connections')
+        self._disconnects = self.registry.counter('smarthome_mqtt_disconnects_total', 'Lost broker connections')
+        self.registry.gauge('smarthome_mqtt_connected', '1 while connected to the broker',
+                            fn=lambda: int(self.connected))
+        self.writer = storage.DbWriter(db_path, on_error=self.log, registry=self.registry)
+        # expires old rows in the background when asked to, see retention.py
+        self.retention = RetentionJob(db_path, raw_days, archive_dir=archive_dir, on_error=self.log) if retention else None
+
+    @property
+    def message_count(self):
+        return self._messages.value
+
+    def start(self):
+        conn = storage.connect(self.db_path)
+        try:
+            storage.ensure_schema(conn)
+        finally:
+            conn.close()
+        self.writer.start()
+        if self.retention:
+            self.retention.start()
+
+    def connect(self):
+        """Start connecting in the background; returns immediately.
+
+        Broker name resolution and the TCP connect run on paho's network
+        thread, subscription happens in _on_connect once the broker accepts us."""
+        self.client = client_init(self.client_name)
+        if not self.verbose:
+            # paho logs every PUBLISH it receives, far too chatty at high rates
+            self.client.on_log = None
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        self.client.loop_start()
+
+    def disconnect(self):
+        if self.client:
+            try:
+                self.client.disconnect()
+                self.client.loop_stop()
+            except Exception:
+                pass
+            self.client = None
+        self.connected = False
+        # make sure everything received so far is on disk
+        self.writer.flush()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        mqtt_init.on_connect(client, userdata, flags, rc)
+        if rc != 0:
+            self._set_status(False, f'Connection refused (code {rc})')
+            return
+        self._connects.inc()
+        # (re)subscribe on every connect so automatic reconnects keep receiving
+        sub = mqtt_init.comm_topic + '#'
+        client.subscribe(sub)
+        self.log('Subscribed to: ' + sub)
+        self._set_status(True, 'Connected')
+
+    def _on_disconnect(self, client, userdata, rc=0, *args):
+        if self.connected and rc != 0:
+            self._disconnects.inc()
+            self._set_status(False, f'Connection lost (code {rc}), reconnecting...')
+
+    def _set_status(self, connected, text):
+        self.connected = connected
+        for listener in self.status_listeners:
+            listener(connected, text)
+
+    def stop(self):
+        if self.client:
+            self.disconnect()
+        if self.retention:
+            self.retention.stop()
+        self.writer.stop()
+
+    def _on_message(self, client, userdata, msg):
+        payload = msg.payload
+        self._received_bytes.inc(len(payload))
+        # compact binary payloads are kept as bytes (stored as a BLOB), JSON as text
+        if not payloads.is_binary(payload):
+            payload = payload.decode('utf-8', 'ignore')
+        self.handle_message(msg.topic, payload)
+
+    def handle_message(self, topic, payload):
+        start = time.perf_counter()
+        self._messages.inc()
+        now = time.time()
+        # Parse payload once; the values are shared by the DB, the listeners and the alarms
+        room_name, sensor_type, data, values = room_config.parse_message(topic, payload)
+
+        self.writer.put(topic, payload, room_config.get_room_id(room_name), values, now)
+        if values:
+            # same timestamp as the stored readings, so memory and DB line up
+            self.recent.add(room_name or topic, values, int(now * 1000))
+
+        message = Message(topic, payload, room_name, sensor_type, data, values)
+        for listener in self.listeners:
+            listener(message)
+
+        if data is not None:
+            self.check_alarms(room_name or topic, data, values)
+        elif topic != mqtt_init.topic_alarm:
+            # alarm texts (ours included, pr/home/alarm is under the subscription) aren't meant to parse
+            self._parse_failures.inc()
+        self._handle_time.observe(time.perf_counter() - start)
+        return message
+
+    def check_alarms(self, source, data, values):
+        for sensor, value in values.items():
+            event = self.alarms.update(source, sensor, value)
+            if event:
+                self.raise_alarm(event)
+
+        # Gas threshold from mqtt_init
+        if 'gas_weight' in data:
+            try:
+                g = float(data['gas_weight'])
+            except (TypeError, ValueError, OverflowError):
+                return
+            if not math.isfinite(g):
+                return
+            self.recent.add(source, {'gas_weight': g})
+            event = self.alarms.update(source, 'gas_weight', g)
+            if event:
+                self.raise_alarm(event)
+
+    def raise_alarm(self, event):
+        self._alarm_count.inc()
+        self.log('ALARM: ' + event.text)
+        # publish alarm; this runs on the MQTT thread and publish() only queues the packet
+        try:
+            if self.client:
+                send_msg(self.client, mqtt_init.topic_alarm, event.text)
+        except Exception as e:
+            self.log('Failed to send alarm: ' + str(e))
+        for listener in self.alarm_listeners:
+            listener(event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless MQTT ingest into the sensor database.')
+    parser.add_argument('--db', default=storage.DB_PATH, help='SQLite database path')
+    parser.add_argument('--report', type=float, default=60.0, help='seconds between throughput reports')
+    parser.add_argument('--verbose', action='store_true', help='log every paho client event')
+    retention.add_arguments(parser)
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--alarm-hold', type=float, default=0.0, metavar='SECONDS',
+                        help='only raise an alarm once the value has stayed above its threshold this long')
+    args = parser.parse_args()
+
+    service = IngestService(args.db, verbose=args.verbose, alarm_hold=args.alarm_hold,
+                            **retention.ingest_options(args))
+    service.status_listeners.append(lambda connected, text: service.log(text))
+    service.start()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port, registry=service.registry)
+        service.log(f'Metrics on http://127.0.0.1:{args.metrics_port}/metrics')
+    service.log(f'Connecting to MQTT broker {mqtt_init.broker}...')
+    service.connect()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *a: stop.set())
+    signal.signal(signal.SIGTERM, lambda *a: stop.set())
+
+    last_count = 0
+    last_time = time.monotonic()
+    while not stop.wait(args.report):
+        now = time.monotonic()
+        count = service.message_count
+        service.log(f'{count - last_count} messages in {now - last_time:.0f}s '
+                    f'({(count - last_count) / (now - last_time):.1f} msg/s)')
+        last_count = count
+        last_time = now
+
+    service.log('Shutting down, flushing writes...')
+    service.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Headless load generator: many simulated rooms x sensors publishing at a fixed aggregate rate.
+
+Meant for finding the ingest limits without opening a sensor window per room:
+    python load_generator.py --rooms 50 --sensors 3 --rate 2000 --duration 60
+(or "python single_sensor.py --headless ..." with the same options).
+Rooms beyond those in room_config.ROOMS are synthetic (pr/home/simN/<sensor>).
+Needs no Qt, only paho-mqtt.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+import payloads
+import room_config
+from broker_config import broker
+
+
+# sensor name in room_config -> key in the published JSON payload
+SENSOR_KEYS = {'temperature': 'temperature', 'humidity': 'humidity', 'light': 'lux'}
+SENSOR_NAMES = list(SENSOR_KEYS)
+SENSOR_GETTERS = {'temperature': 'get_temperature', 'humidity': 'get_humidity', 'light': 'get_light'}
+
+# how often each worker wakes up to publish whatever is due
+TICK = 0.005
+# backlog (in seconds of messages) a worker may catch up on after a stall; older sends are dropped
+MAX_BACKLOG = 1.0
+
+
+class SensorData:
+    """Generates realistic sensor values"""
+    def __init__(self):
+        self.time_offset = random.uniform(0, 10)
+        self.base_temp = 22
+        self.base_humidity = 50
+        self.base_lux = 800
+
+    def get_temperature(self):
+        variation = 2 * math.sin(time.time() / 30 + self.time_offset)
+        noise = random.gauss(0, 0.3)
+        return round(self.base_temp + variation + noise, 1)
+
+    def get_humidity(self):
+        variation = 8 * math.sin(time.time() / 40 + self.time_offset)
+        noise = random.gauss(0, 0.5)
+        return round(max(10, min(100, self.base_humidity + variation + noise)), 1)
+
+    def get_light(self):
+        variation = self.base_lux * 0.3 * math.sin(time.time() / 60 + self.time_offset)
+        noise = random.gauss(0, self.base_lux * 0.05)
+        return round(max(0, self.base_lux + variation + noise), 0)
+
+    def reader(self, sensors, timestamp=False):
+        """Function returning the payload dict of the given sensors' current values,
+        plus the sender's clock as 'ts' when timestamp is set."""
+        getters = [(SENSOR_KEYS[sensor], getattr(self, SENSOR_GETTERS[sensor])) for sensor in sensors]
+
+        def read():
+            values = {key: get() for key, get in getters}
+            if timestamp:
+                values['ts'] = round(time.time(), 3)
+            return values
+        return read
+
+
+def build_streams(rooms, sensors, combined=False):
+    """(topic, read) for every simulated sensor, or for every room when
+    combined; read() returns the payload as a dict.
+
+    The first rooms are the configured ones, the rest are synthetic."""
+    configured = list(room_config.ROOMS.values())
+    streams = []
+    for i in range(rooms):
+        data = SensorData()
+        names = SENSOR_NAMES[:sensors]
+        if combined:
+            topic = configured[i]["combined"] if i < len(configured) else f'pr/home/sim{i + 1}/{room_config.COMBINED}'
+            streams.append((topic, data.reader(names, timestamp=True)))
+            continue
+        for sensor in names:
+            if i < len(configured):
+                topic = configured[i]["sensors"][sensor]
+            else:
+                topic = f'pr/home/sim{i + 1}/{sensor}'
+            streams.append((topic, data.reader((sensor,))))
+    return streams
+
+
+class LoadGenerator:
+    """Publishes the streams round-robin from a few MQTT clients.
+
+    Each client gets its own worker thread and an equal share of the streams
+    and of the rate. Workers are deadline based: on every tick they send as
+    many messages as are due since the start, so sleep jitter and slow
+    publishes are made up for instead of accumulating as drift."""
+
+    def __init__(self, streams, rate, clients=1, qos=0, binary=False, log=print):
+        self.streams = streams
+        self.binary = binary
+        self.rate = float(rate)
+        self.clients = max(1, min(clients, len(streams)))
+        self.qos = qos
+        self.log = log
+        self._stop = threading.Event()
+        self._threads = []
+        self._mqtt = []
+        # per worker, only written by that worker
+        self.sent = [0] * self.clients
+        self.errors = [0] * self.clients
+        self.dropped = [0] * self.clients
+
+    def connect(self, timeout=10.0):
+        connected = []
+        for n in range(self.clients):
+            ready = threading.Event()
+            client = mqtt.Client(f'load_{random.randint(10000, 99999)}_{n}', clean_session=True)
+            client.user_data_set(ready)
+            client.on_connect = self._on_connect
+            if broker.username != '':
+                client.username_pw_set(broker.username, broker.password)
+            client.connect_async(broker.host, broker.port)
+            client.loop_start()
+            self._mqtt.append(client)
+            connected.append(ready)
+        deadline = time.monotonic() + timeout
+        for ready in connected:
+            if not ready.wait(max(0.0, deadline - time.monotonic())):
+                raise RuntimeError(f'could not connect to {broker} within {timeout:.0f} s')
+        self.log(f'{self.clients} client(s) connected to {broker}')
+
+    def _on_connect(self, client, ready, flags, rc):
+        if rc == 0:
+            ready.set()
+        else:
+            self.log(f'connection refused: code {rc}')
+
+    def start(self):
+        share = self.rate / self.clients
+        for n, client in enumerate(self._mqtt):
+            streams = self.streams[n::self.clients]
+            thread = threading.Thread(target=self._worker, args=(n, client, streams, share), daemon=True)
+            self._threads.append(thread)
+        self.started = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self, n, client, streams, rate):
+        publish = client.publish
+        qos = self.qos
+        encode = payloads.encode_binary if self.binary else json.dumps
+        max_backlog = max(1, int(rate * MAX_BACKLOG))
+        i = 0
+        done = 0  # messages due so far, sent or dropped
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            due = int((time.perf_counter() - t0) * rate) - done
+            if due > max_backlog:
+                # fell too far behind (e.g. a stalled broker connection): skip instead of bursting
+                self.dropped[n] += due - max_backlog
+                done += due - max_backlog
+                due = max_backlog
+            for _ in range(due):
+                topic, read = streams[i]
+                i = (i + 1) % len(streams)
+                if publish(topic, encode(read()), qos=qos).rc != mqtt.MQTT_ERR_SUCCESS:
+                    self.errors[n] += 1
+                self.sent[n] += 1
+            done += due
+            self._stop.wait(TICK)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for client in self._mqtt:
+            client.disconnect()
+            client.loop_stop()
+
+    def totals(self):
+        return sum(self.sent), sum(self.errors), sum(self.dropped)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Publish simulated sensor readings from many rooms.')
+    parser.add_argument('--rooms', type=int, default=len(room_config.ROOMS),
+                        help='number of rooms; rooms beyond room_config.ROOMS are synthetic')
+    parser.add_argument('--sensors', type=int, default=3, choices=range(1, len(SENSOR_NAMES) + 1),
+                        help='sensors per room (temperature, humidity, light)')
+    parser.add_argument('--combined', action='store_true',
+                        help='one message per room carrying all its sensors (room_config "combined" topics)')
+    parser.add_argument('--rate', type=float, default=100.0, help='aggregate messages per second')
+    parser.add_argument('--clients', type=int, default=1, help='MQTT connections to spread the load over')
+    parser.add_argument('--qos', type=int, default=0, choices=(0, 1))
+    parser.add_argument('--binary', action='store_true', help='publish the compact binary payload instead of JSON')
+    parser.add_argument('--duration', type=float, default=0, help='seconds to run, 0 runs until Ctrl+C')
+    parser.add_argument('--report', type=float, default=5.0, help='seconds between rate reports')
+    args = parser.parse_args(argv)
+
+    streams = build_streams(args.rooms, args.sensors, args.combined)
+    gen = LoadGenerator(streams, args.rate, args.clients, args.qos, args.binary)
+    print(f'{args.rooms} rooms x {args.sensors} sensors, {len(streams)} topics, target {args.rate:.0f} msg/s')
+    gen.connect()
+    gen.start()
+
+    last_time, last_sent = gen.started, 0
+    try:
+        while not args.duration or time.perf_counter() - gen.started < args.duration:
+            wait = args.report
+            if args.duration:
+                wait = min(wait, args.duration - (time.perf_counter() - gen.started))
+            time.sleep(max(wait, 0))
+            now = time.perf_counter()
+            sent, errors, dropped = gen.totals()
+            print(f'{(sent - last_sent) / (now - last_time):9.1f} msg/s  (sent {sent}, errors {errors}, dropped {dropped})')
+            last_time, last_sent = now, sent
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - gen.started
+    gen.stop()
+
+    sent, errors, dropped = gen.totals()
+    print(f'achieved {sent / elapsed:.1f} msg/s of {args.rate:.0f} target '
+          f'({sent} sent in {elapsed:.1f} s, {errors} errors, {dropped} dropped behind schedule)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import logging
+from collections import deque
+from datetime import datetime
+
+from PyQt5 import QtWidgets, QtCore
+
+
+# same numbering as the logging module so levels can be given by name
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+
+
+class LogConsole(QtWidgets.QPlainTextEdit):
+    """Read-only log view with bounded memory and a capped update rate.
+
+    log() only appends to a ring buffer; a timer moves whatever accumulated
+    into the widget in one append per frame. The document itself keeps at
+    most `max_blocks` lines, older ones are dropped by Qt. Lines below
+    `level` are discarded before they are even formatted."""
+
+    def __init__(self, max_blocks=2000, fps=10, level=INFO, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_blocks)
+        self.level = level
+        # more lines than fit in the document would be dropped by Qt anyway
+        self._pending = deque(maxlen=max_blocks)
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(int(1000 / fps))
+
+    def log(self, text, level=INFO):
+        if level < self.level:
+            return
+        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._pending.append(f'[{ts}] {text}')
+
+    def flush(self):
+        # a hidden console keeps buffering and catches up when shown again
+        if not self._pending or not self.isVisible():
+            return
+        self.appendPlainText('\n'.join(self._pending))
+        self._pending.clear()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.flush()
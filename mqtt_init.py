@@ -1,30 +1,24 @@
-import socket
 import paho.mqtt.client as mqtt
 import random
 from icecream import ic
 from datetime import datetime
 
-nb=1 # 0- HIT-"139.162.222.115", 1 - open HiveMQ - broker.hivemq.com
-brokers=[str(socket.gethostbyname('vmm1.saaintertrade.com')), str(socket.gethostbyname('broker.hivemq.com'))]
-ports=['80','1883']
-usernames = ['MATZI',''] # should be modified for HIT
-passwords = ['MATZI',''] # should be modified for HIT
-broker_ip=brokers[nb]
-port=ports[nb]
-username = usernames[nb]
-password = passwords[nb]
+from broker_config import nb, broker
+
 conn_time = 0 # 0 stands for endless
 mzs=['matzi/','']
 sub_topics =[mzs[nb]+'#','#']
 pub_topics = [mzs[nb]+'test','test']
 
-broker_ip=brokers[nb]
-broker_port=ports[nb]
-username = usernames[nb]
-password = passwords[nb]
 sub_topic = sub_topics[nb]
 pub_topic = pub_topics[nb]
 
+# kept for existing callers; these are the configured host name/port, not a resolved IP
+broker_ip = broker.host
+broker_port = port = str(broker.port)
+username = broker.username
+password = broker.password
+
 
 # Common
 conn_time = 0 # 0 stands for endless loop
@@ -72,8 +66,10 @@ def client_init(cname):
     client.on_disconnect=on_disconnect
     client.on_log=on_log
     client.on_message=on_message        
-    if username !="":
-        client.username_pw_set(username, password)        
-    ic("Connecting to broker ",broker_ip)
-    client.connect(broker_ip,int(port))     #connect to broker
+    if broker.username !="":
+        client.username_pw_set(broker.username, broker.password)
+    ic("Connecting to broker ",str(broker))
+    # DNS lookup and TCP connect happen in the network thread once the caller runs
+    # loop_start(); subscribe from on_connect, the connection isn't up on return
+    client.connect_async(broker.host, broker.port)
     return client
@@ -0,0 +1,171 @@
+import json
+import math
+import struct
+
+try:
+    # several times faster than the json module for small objects; optional
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+# Payload keys seen from the different sensors for each metric, in order of preference
+METRIC_KEYS = {
+    'temperature': ('temperature', 'temp', 'Temp', 'TEMP'),
+    'humidity': ('humidity', 'Humidity (%)', 'humidity_%', 'hum'),
+    'lux': ('lux', 'light', 'Light'),
+}
+
+
+# Compact binary payload: one version byte, then (metric code, float64) pairs,
+# e.g. 10 bytes for a single reading instead of ~22 for {"temperature": 24.68}.
+# The version byte can never start a JSON text, which is how the two are told apart.
+BINARY_VERSION = 1
+# 'ts' is the sender's clock (epoch seconds) in combined per-room messages
+BINARY_METRICS = {'temperature': 1, 'humidity': 2, 'lux': 3, 'gas_weight': 4, 'ts': 5}
+_BINARY_NAMES = {code: metric for metric, code in BINARY_METRICS.items()}
+_BINARY_PREFIX = bytes((BINARY_VERSION,))
+_BINARY_READING = 9  # struct.calcsize('<Bd')
+_BINARY_MAX_READINGS = 32
+_binary_layouts = {}
+
+
+def _binary_layout(count):
+    layout = _binary_layouts.get(count)
+    if layout is None:
+        layout = _binary_layouts[count] = struct.Struct('<B' + 'Bd' * count)
+    return layout
+
+
+def is_binary(payload):
+    return isinstance(payload, (bytes, bytearray)) and payload[:1] == _BINARY_PREFIX
+
+
+def encode_binary(values):
+    """{metric: value} -> compact binary payload. Metrics without a code are left out."""
+    fields = [BINARY_VERSION]
+    for metric, value in values.items():
+        code = BINARY_METRICS.get(metric)
+        if code is not None:
+            fields += (code, value)
+    return _binary_layout((len(fields) - 1) // 2).pack(*fields)
+
+
+_BINARY_SINGLE = struct.Struct('<BBd')
+
+
+def decode_binary(payload):
+    """Compact binary payload -> {metric: value}, None if it is malformed.
+    NaN and infinite values are left out like unknown codes."""
+    if len(payload) == _BINARY_SINGLE.size:
+        # by far the most common case, one reading per message
+        _version, code, value = _BINARY_SINGLE.unpack(payload)
+        metric = _BINARY_NAMES.get(code)
+        return {} if metric is None or not math.isfinite(value) else {metric: value}
+    count, rest = divmod(len(payload) - 1, _BINARY_READING)
+    if rest or not 0 < count <= _BINARY_MAX_READINGS:
+        return None
+    fields = _binary_layout(count).unpack(payload)
+    data = {}
+    for i in range(1, len(fields), 2):
+        metric = _BINARY_NAMES.get(fields[i])
+        # codes added by newer senders are skipped
+        if metric is not None and math.isfinite(fields[i + 1]):
+            data[metric] = fields[i + 1]
+    return data
+
+
+def decode(payload):
+    """Return the payload as a dict, or None if it is neither a JSON object
+    nor a compact binary payload."""
+    if isinstance(payload, (bytes, bytearray)) and payload[:1] == _BINARY_PREFIX:
+        return decode_binary(payload)
+    try:
+        data = _loads(payload)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def to_text(payload):
+    """Printable form of a payload for logs and tables; binary ones are shown as JSON."""
+    if isinstance(payload, str):
+        return payload
+    if is_binary(payload):
+        data = decode_binary(payload)
+        if data is not None:
+            return 'bin ' + json.dumps(data)
+    return bytes(payload).decode('utf-8', 'replace')
+
+
+def _to_float(val):
+    if isinstance(val, str):
+        # Remove % sign if present
+        val = val.replace('%', '').strip()
+    try:
+        val = float(val)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # 'nan'/'inf' parse as floats, but readings.value can't hold them (SQLite stores NaN as NULL)
+    return val if math.isfinite(val) else None
+
+
+def compile_schema(schema):
+    """Turn a payload schema {metric: key or (key, ...)} into an extractor,
+    a function decoded payload -> {metric: float}.
+
+    Keys of a metric are tried in order and the first one present is used.
+    The common cases (one metric, one key per metric) get specialised
+    functions so no per-message work is spent on the schema itself."""
+    fields = tuple((metric, (keys,) if isinstance(keys, str) else tuple(keys)) for metric, keys in schema.items())
+
+    if len(fields) == 1 and len(fields[0][1]) == 1:
+        metric, (key,) = fields[0]
+
+        def extract(data):
+            val = data.get(key)
+            if val is None:
+                return {}
+            if type(val) is float:
+                return {metric: val} if math.isfinite(val) else {}
+            val = _to_float(val)
+            return {} if val is None else {metric: val}
+        return extract
+
+    if all(len(keys) == 1 for _metric, keys in fields):
+        pairs = tuple((metric, keys[0]) for metric, keys in fields)
+
+        def extract(data):
+            values = {}
+            for metric, key in pairs:
+                val = data.get(key)
+                if val is not None:
+                    val = _to_float(val)
+                    if val is not None:
+                        values[metric] = val
+            return values
+        return extract
+
+    def extract(data):
+        values = {}
+        for metric, keys in fields:
+            for key in keys:
+                val = data.get(key)
+                if val is None:
+                    continue
+                val = _to_float(val)
+                if val is not None:
+                    values[metric] = val
+                break
+        return values
+    return extract
+
+
+# every known alias of every metric, for payloads nothing more specific is known about
+extract_any = compile_schema(METRIC_KEYS)
+
+
+def extract_values(data):
+    """Pull the numeric metric readings out of a decoded payload."""
+    return extract_any(data)
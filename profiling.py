@@ -0,0 +1,79 @@
+"""Opt-in profiling of selected methods (the data manager's GUI hot paths).
+
+Nothing is touched unless instrument() is called: the methods are then
+replaced on their class by wrappers that record call counts and wall time,
+and with cprofile=True run under one shared cProfile.Profile, so the time
+inside them can be broken down into json/SQLite/Qt calls afterwards.
+Single-threaded: only wrap methods that run on one thread (the GUI's)."""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+from datetime import datetime
+
+
+class Profiler:
+    def __init__(self, cprofile=False):
+        self.started = time.perf_counter()
+        self.stats = {}  # name -> [calls, total seconds, max seconds]
+        self.profile = cProfile.Profile() if cprofile else None
+        # wrapped methods calling each other: only the outermost switches cProfile
+        self._depth = 0
+
+    def wrap(self, name, fn):
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        perf_counter = time.perf_counter
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = self.profile
+            if profile is not None:
+                if not self._depth:
+                    profile.enable()
+                self._depth += 1
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                if profile is not None:
+                    self._depth -= 1
+                    if not self._depth:
+                        profile.disable()
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+        # with pyqtSlot's signature copied over, a connect() would resolve to
+        # the slot registered for the original method and bypass the wrapper
+        wrapper.__dict__.pop('__pyqtSignature__', None)
+        return wrapper
+
+    def instrument(self, cls, *names):
+        """Replace cls.<name> for each name by a timed wrapper."""
+        for name in names:
+            setattr(cls, name, self.wrap(f'{cls.__name__}.{name}', getattr(cls, name)))
+
+    def report(self, path, title='Profile'):
+        """Write the per-method table (and the cProfile top list, with the
+        raw data next to it as <path>.prof) to `path`; returns the text."""
+        run = time.perf_counter() - self.started
+        lines = [f'{title}, {datetime.now().isoformat(timespec="seconds")}, {run:.1f} s run', '',
+                 f'{"method":40s} {"calls":>8s} {"total ms":>10s} {"mean ms":>9s} {"max ms":>9s} {"% of run":>8s}']
+        for name, (calls, total, longest) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            mean = total / calls * 1000 if calls else 0.0
+            lines.append(f'{name:40s} {calls:8d} {total * 1000:10.1f} {mean:9.3f} {longest * 1000:9.2f} '
+                         f'{total / run * 100:8.1f}')
+        if self.profile is not None:
+            dump = os.path.splitext(path)[0] + '.prof'
+            self.profile.dump_stats(dump)
+            buf = io.StringIO()
+            pstats.Stats(self.profile, stream=buf).sort_stats('cumulative').print_stats(40)
+            lines += ['', f'cProfile inside the methods above, top 40 by cumulative time '
+                          f'(all of it in {dump}, python -m pstats {dump}):', buf.getvalue()]
+        text = '\n'.join(lines) + '\n'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return text
@@ -0,0 +1,120 @@
+import itertools
+
+import numpy as np
+
+import room_config
+
+
+def load_sensor(conn, sensor, since_ms=None, until_ms=None, room_ids=None, cancelled=None):
+    """Columnar (room_id, ts, value) arrays of one sensor's readings, ordered
+    by room and then time (the order group_stats wants).
+
+    Each room is read with its own query on the (room_id, sensor, ts) index,
+    so SQLite returns rows already ordered. Readings of unrouted topics are
+    reported as room_id 0. Rows go straight from the cursor into one flat
+    float64 buffer; no per-row Python objects are kept. Returns None when
+    cancelled() turns true, which is checked between rooms."""
+    if room_ids is None:
+        room_ids = [r["room_id"] for r in room_config.ROOMS.values()] + [None]
+    sql = 'SELECT ts, value FROM readings WHERE room_id IS ? AND sensor = ?'
+    extra = []
+    if since_ms is not None:
+        sql += ' AND ts >= ?'
+        extra.append(since_ms)
+    if until_ms is not None:
+        sql += ' AND ts < ?'
+        extra.append(until_ms)
+    sql += ' ORDER BY ts'
+    rooms, tss, vals = [], [], []
+    for room_id in room_ids:
+        if cancelled and cancelled():
+            return None
+        flat = np.fromiter(itertools.chain.from_iterable(conn.execute(sql, [room_id, sensor] + extra)),
+                           dtype=np.float64)
+        if not len(flat):
+            continue
+        cols = flat.reshape(-1, 2)
+        rooms.append(np.full(len(cols), room_id or 0, dtype=np.int64))
+        tss.append(cols[:, 0].astype(np.int64))
+        vals.append(cols[:, 1].copy())
+    if not rooms:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    return np.concatenate(rooms), np.concatenate(tss), np.concatenate(vals)
+
+
+def _percentile(sorted_vals, starts, counts, q):
+    # linear interpolation between closest ranks, same as np.percentile's default, for every group at once
+    pos = starts + q * (counts - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + counts - 1)
+    frac = pos - lo
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * frac
+
+
+def group_stats(room_ids, ts, values, threshold=None, presorted=False):
+    """Per-room statistics of one sensor, all groups computed together.
+
+    Returns {room_id: {...}} with count, min, max, mean, std, p50, p95, p99,
+    rate_per_h (average change per hour between the first and last reading)
+    and, when a threshold is given, alarm_s / alarm_pct: the time the value
+    spent at or above it, holding each reading until the next one.
+    Pass presorted=True for input already ordered by room, then time
+    (as returned by load_sensor) to skip the initial sort."""
+    n = len(values)
+    if n == 0:
+        return {}
+    if not presorted:
+        # time order within each room
+        order = np.lexsort((ts, room_ids))
+        room_ids = room_ids[order]
+        ts = ts[order]
+        values = values[order]
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(room_ids)) + 1))
+    counts = np.diff(np.append(starts, n))
+    lasts = starts + counts - 1
+    groups = np.repeat(np.arange(len(starts)), counts)
+
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    # two-pass variance, stable for large offsets such as lux readings
+    dev = values - means[groups]
+    stds = np.sqrt(np.add.reduceat(dev * dev, starts) / counts)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+
+    spans_ms = (ts[lasts] - ts[starts]).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.where(spans_ms > 0, (values[lasts] - values[starts]) / (spans_ms / 3600000.0), np.nan)
+
+    alarm_ms = None
+    if threshold is not None and n > 1:
+        dt = np.diff(ts).astype(np.float64)
+        # an interval counts when it stays inside one room and starts in alarm
+        held = (groups[1:] == groups[:-1]) & (values[:-1] >= threshold)
+        alarm_ms = np.bincount(groups[:-1][held], weights=dt[held], minlength=len(starts))
+
+    # percentiles need the values sorted within each room; rooms are contiguous,
+    # so sorting each slice is cheaper than one global lexsort
+    sorted_vals = np.concatenate([np.sort(values[s:s + c]) for s, c in zip(starts, counts)])
+    pcts = {q: _percentile(sorted_vals, starts, counts, q / 100.0) for q in (50, 95, 99)}
+
+    result = {}
+    for g, room_id in enumerate(room_ids[starts].tolist()):
+        row = {
+            'count': int(counts[g]),
+            'min': float(mins[g]),
+            'max': float(maxs[g]),
+            'mean': float(means[g]),
+            'std': float(stds[g]),
+            'p50': float(pcts[50][g]),
+            'p95': float(pcts[95][g]),
+            'p99': float(pcts[99][g]),
+            'rate_per_h': float(rates[g]),
+        }
+        if threshold is not None:
+            a = float(alarm_ms[g]) if alarm_ms is not None else 0.0
+            row['alarm_s'] = a / 1000.0
+            row['alarm_pct'] = 100.0 * a / float(spans_ms[g]) if spans_ms[g] > 0 else 0.0
+        result[room_id] = row
+    return result
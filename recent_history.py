@@ -0,0 +1,137 @@
+"""Recent readings kept in memory: one fixed-capacity ring buffer of
+(ts, value) per source and sensor, fed by IngestService, so questions about
+the last few minutes or hours never need the database."""
+import bisect
+import threading
+import time
+from array import array
+
+
+# samples kept per series; at one reading every 5 s that is 5 hours
+CAPACITY = 3600
+# series beyond this many (e.g. a flood of unknown topics) are not kept
+MAX_SERIES = 256
+
+
+class RingBuffer:
+    """At most `capacity` (ts, value) samples in arrival order, in two flat
+    arrays. ts is epoch milliseconds like readings.ts in the database.
+    Not thread-safe on its own, RecentHistory locks around it."""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._ts = array('q')
+        self._values = array('d')
+        # physical index of the oldest sample; stays 0 until the buffer is full
+        self._start = 0
+
+    def __len__(self):
+        return len(self._ts)
+
+    def append(self, ts, value):
+        if len(self._ts) < self.capacity:
+            self._ts.append(ts)
+            self._values.append(value)
+        else:
+            self._ts[self._start] = ts
+            self._values[self._start] = value
+            self._start = (self._start + 1) % self.capacity
+
+    def oldest(self):
+        return self._ts[self._start] if self._ts else None
+
+    def latest(self):
+        """(ts, value) of the newest sample, or None."""
+        if not self._ts:
+            return None
+        return self._ts[self._start - 1], self._values[self._start - 1]
+
+    def _find(self, ts):
+        # first logical position with a timestamp >= ts; samples arrive in time order
+        t, start, n = self._ts, self._start, len(self._ts)
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if t[(start + mid) % n] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slice(self, buf, lo):
+        # logical positions lo.. of one of the arrays, oldest first
+        start = self._start + lo
+        if start < len(buf):
+            return buf[start:] + buf[:self._start]
+        return buf[start - len(buf):self._start]
+
+    def since(self, ts, previous=False):
+        """(ts, values) arrays of the samples taken at or after `ts`, oldest
+        first; previous=True adds the last sample before `ts` if there is one."""
+        lo = self._find(ts)
+        if previous and lo:
+            lo -= 1
+        return self._slice(self._ts, lo), self._slice(self._values, lo)
+
+
+class RecentHistory:
+    """A RingBuffer per (source, sensor), where source is the room name, or
+    the topic of unrouted messages (the keys AlarmEngine uses too).
+
+    Fed from the MQTT thread and read from the GUI, so every call takes a
+    lock; queries return copies. Memory is bounded by
+    max_series * capacity * 16 bytes."""
+
+    def __init__(self, capacity=CAPACITY, max_series=MAX_SERIES):
+        self.capacity = capacity
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def add(self, source, values, ts=None):
+        """Append one message's {sensor: value} readings taken at `ts` (epoch ms, default now)."""
+        if ts is None:
+            ts = int(time.time() * 1000)
+        with self._lock:
+            for sensor, value in values.items():
+                buf = self._series.get((source, sensor))
+                if buf is None:
+                    if len(self._series) >= self.max_series:
+                        continue
+                    buf = self._series[(source, sensor)] = RingBuffer(self.capacity)
+                buf.append(ts, value)
+
+    def window(self, source, sensor, seconds=None, since_ms=None, until_ms=None, previous=False):
+        """(ts, values) arrays of one series over the last `seconds` (or from
+        `since_ms`) up to `until_ms`, oldest first; empty for an unknown
+        series. previous=True adds the last sample before the window."""
+        if seconds is not None:
+            since_ms = int((time.time() - seconds) * 1000)
+        with self._lock:
+            buf = self._series.get((source, sensor))
+            if buf is None:
+                return array('q'), array('d')
+            ts, values = buf.since(since_ms or 0, previous)
+        if until_ms is not None:
+            end = bisect.bisect_left(ts, until_ms)
+            ts, values = ts[:end], values[:end]
+        return ts, values
+
+    def latest(self, source, sensor):
+        """(ts, value) of the newest sample of a series, or None."""
+        with self._lock:
+            buf = self._series.get((source, sensor))
+            return buf.latest() if buf is not None else None
+
+    def covers(self, source, sensor, since_ms):
+        """True if every reading of the series since `since_ms` is still held,
+        i.e. the buffer reaches back at least that far."""
+        with self._lock:
+            buf = self._series.get((source, sensor))
+            oldest = buf.oldest() if buf is not None else None
+        return oldest is not None and since_ms is not None and oldest <= since_ms
+
+    def series(self):
+        """(source, sensor) pairs with samples."""
+        with self._lock:
+            return list(self._series)
@@ -0,0 +1,222 @@
+"""Retention for sensor_data.db: expire old rows in small batches, optionally
+archiving raw messages first, and hand freed pages back with incremental vacuum.
+
+Off unless asked for (--retention / --raw-days of ingest_service.py and
+data_manager.py): by default nothing is ever deleted. Databases created
+before incremental vacuum was set up are converted once, with nothing else
+running, by
+    python retention.py [--db sensor_data.db]
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import storage
+
+
+# days raw messages/readings are kept
+RAW_DAYS = 7
+# days each rollup table is kept; the history statistics only read rollup_1m
+# for ranges up to a day, longer ones come from rollup_1h
+ROLLUP_DAYS = {
+    'rollup_1m': 30,
+    'rollup_1h': 365,
+}
+
+DAY_MS = 24 * 3600 * 1000
+
+
+class RetentionJob(threading.Thread):
+    """Background thread that deletes expired rows every `interval` seconds.
+
+    Raw messages (and their readings) older than `raw_days` and rollup
+    buckets older than `rollup_days[table]` are deleted in transactions of at
+    most `batch_size` rows with a short pause in between, so the DbWriter
+    never waits long for the write lock. With `archive_dir` set, expired
+    messages are first appended to one gzip'd JSON-lines file per day
+    (messages-YYYY-MM-DD.jsonl.gz). A days value of None keeps that data forever."""
+
+    def __init__(self, db_path=storage.DB_PATH, raw_days=RAW_DAYS, rollup_days=None, archive_dir=None,
+                 interval=3600.0, batch_size=2000, pause=0.05, vacuum_pages=500, on_error=None):
+        super().__init__(name='RetentionJob', daemon=True)
+        self.db_path = db_path
+        self.raw_days = raw_days
+        self.rollup_days = dict(ROLLUP_DAYS if rollup_days is None else rollup_days)
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.on_error = on_error
+        self._stopping = threading.Event()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            try:
+                self.run_once()
+            except (sqlite3.Error, OSError) as e:
+                if self.on_error:
+                    self.on_error(f'Retention pass failed: {e}')
+            if self._stopping.wait(self.interval):
+                break
+
+    def run_once(self, now=None):
+        """One full pass; returns {table: rows deleted}."""
+        now = time.time() if now is None else now
+        conn = storage.connect(self.db_path)
+        try:
+            deleted = {}
+            if self.raw_days is not None:
+                cutoff = datetime.fromtimestamp(now - self.raw_days * 86400).isoformat()
+                deleted['messages'] = self._expire_messages(conn, cutoff)
+            for table, width in storage.ROLLUPS:
+                days = self.rollup_days.get(table)
+                if days is not None:
+                    deleted[table] = self._expire_rollups(conn, table, width, int(now * 1000) - days * DAY_MS)
+            self._vacuum(conn)
+            return deleted
+        finally:
+            conn.close()
+
+    def _expire_messages(self, conn, cutoff):
+        # DbWriter hands out ids in arrival order, so expired messages are always
+        # a prefix of the table: look at the oldest batch only, never scan by ts
+        deleted = 0
+        while not self._stopping.is_set():
+            rows = conn.execute('SELECT id, ts, topic, payload FROM messages ORDER BY id LIMIT ?',
+                                (self.batch_size,)).fetchall()
+            expired = []
+            for row in rows:
+                if (row[1] or '') >= cutoff:
+                    break
+                expired.append(row)
+            if not expired:
+                break
+            last_id = expired[-1][0]
+            if self.archive_dir:
+                self._archive(conn, expired)
+            with conn:
+                conn.execute('DELETE FROM readings WHERE message_id <= ?', (last_id,))
+                conn.execute('DELETE FROM messages WHERE id <= ?', (last_id,))
+            deleted += len(expired)
+            if len(expired) < len(rows):
+                break
+            self._stopping.wait(self.pause)
+        return deleted
+
+    def _archive(self, conn, rows):
+        readings = {}
+        for msg_id, room_id, sensor, value in conn.execute(
+                'SELECT message_id, room_id, sensor, value FROM readings WHERE message_id BETWEEN ? AND ?',
+                (rows[0][0], rows[-1][0])):
+            entry = readings.setdefault(msg_id, {'room_id': room_id, 'values': {}})
+            entry['values'][sensor] = value
+
+        by_day = {}
+        for msg_id, ts, topic, payload in rows:
+            record = {'id': msg_id, 'ts': ts, 'topic': topic}
+            if isinstance(payload, (bytes, bytearray)):
+                record['payload_hex'] = bytes(payload).hex()
+            else:
+                record['payload'] = payload
+            record.update(readings.get(msg_id, {}))
+            by_day.setdefault((ts or 'unknown')[:10], []).append(json.dumps(record))
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        for day, lines in by_day.items():
+            path = os.path.join(self.archive_dir, f'messages-{day}.jsonl.gz')
+            # appending adds a gzip member per batch, gzip readers see one stream
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+                    gz.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                raw.flush()
+                # on disk before the rows are deleted
+                os.fsync(raw.fileno())
+
+    def _expire_rollups(self, conn, table, width, cutoff_ms):
+        # the primary key starts with (room_id, sensor): walk the series and
+        # delete each one's old buckets in ranges of at most batch_size buckets
+        series = []
+        row = conn.execute(f'SELECT room_id, sensor FROM {table} ORDER BY room_id, sensor LIMIT 1').fetchone()
+        while row:
+            series.append(row)
+            row = conn.execute(f'SELECT room_id, sensor FROM {table} WHERE (room_id, sensor) > (?, ?) '
+                               f'ORDER BY room_id, sensor LIMIT 1', row).fetchone()
+        deleted = 0
+        for room_id, sensor in series:
+            while not self._stopping.is_set():
+                oldest = conn.execute(f'SELECT MIN(bucket) FROM {table} WHERE room_id = ? AND sensor = ?',
+                                      (room_id, sensor)).fetchone()[0]
+                if oldest is None or oldest >= cutoff_ms:
+                    break
+                upper = min(cutoff_ms, oldest + width * self.batch_size)
+                with conn:
+                    deleted += conn.execute(f'DELETE FROM {table} WHERE room_id = ? AND sensor = ? AND bucket < ?',
+                                            (room_id, sensor, upper)).rowcount
+                self._stopping.wait(self.pause)
+        return deleted
+
+    def _vacuum(self, conn):
+        # only has an effect with auto_vacuum=INCREMENTAL: set up by storage.connect on
+        # new files, by storage.enable_incremental_vacuum (main below) on older ones
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        while free and not self._stopping.is_set():
+            conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_pages})').fetchall()
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if left >= free:
+                break
+            free = left
+            self._stopping.wait(self.pause)
+
+
+def add_arguments(parser):
+    """The retention options shared by ingest_service.py and data_manager.py."""
+    parser.add_argument('--retention', action='store_true',
+                        help=f'expire old rows in the background (raw messages after {RAW_DAYS:g} days, '
+                             'rollups after 30/365 days); off by default, nothing is deleted')
+    parser.add_argument('--raw-days', type=float, metavar='DAYS',
+                        help=f'days raw messages are kept, implies --retention (default {RAW_DAYS:g}); '
+                             '0 keeps them forever and only expires the rollups')
+    parser.add_argument('--archive', metavar='DIR',
+                        help='with retention, append expired messages to per-day .jsonl.gz files in DIR first')
+
+
+def ingest_options(args):
+    """IngestService keyword arguments for the options of add_arguments()."""
+    raw_days = RAW_DAYS if args.raw_days is None else args.raw_days
+    return {'retention': args.retention or args.raw_days is not None,
+            'raw_days': raw_days or None, 'archive_dir': args.archive}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert an existing database to incremental vacuum, so retention can shrink the file. '
+                    'Rewrites the whole file once: stop data_manager.py and ingest_service.py first.')
+    parser.add_argument('--db', default=storage.DB_PATH, help='SQLite database path')
+    args = parser.parse_args()
+    conn = storage.connect(args.db)
+    try:
+        storage.ensure_schema(conn)
+        start = time.monotonic()
+        if storage.enable_incremental_vacuum(conn):
+            print(f'{args.db} converted in {time.monotonic() - start:.1f}s')
+        else:
+            print(f'{args.db} already uses incremental vacuum')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
+import payloads
 
 ROOMS = {
     "Living Room": {
         "room_id": 1,
+        "combined": "pr/home/room1/all",
         "sensors": {
             "temperature": "pr/home/room1/temperature",
             "humidity": "pr/home/room1/humidity",
@@ -10,6 +12,7 @@ ROOMS = {
     },
     "Bedroom": {
         "room_id": 2,
+        "combined": "pr/home/room2/all",
         "sensors": {
             "temperature": "pr/home/room2/temperature",
             "humidity": "pr/home/room2/humidity",
@@ -18,6 +21,7 @@ ROOMS = {
     },
     "Kitchen": {
         "room_id": 3,
+        "combined": "pr/home/room3/all",
         "sensors": {
             "temperature": "pr/home/room3/temperature",
             "humidity": "pr/home/room3/humidity",
@@ -26,6 +30,7 @@ ROOMS = {
     },
     "Bathroom": {
         "room_id": 4,
+        "combined": "pr/home/room4/all",
         "sensors": {
             "temperature": "pr/home/room4/temperature",
             "humidity": "pr/home/room4/humidity",
@@ -34,6 +39,7 @@ ROOMS = {
     },
     "Office": {
         "room_id": 5,
+        "combined": "pr/home/room5/all",
         "sensors": {
             "temperature": "pr/home/room5/temperature",
             "humidity": "pr/home/room5/humidity",
@@ -42,6 +48,7 @@ ROOMS = {
     },
     "Garage": {
         "room_id": 6,
+        "combined": "pr/home/room6/all",
         "sensors": {
             "temperature": "pr/home/room6/temperature",
             "humidity": "pr/home/room6/humidity",
@@ -61,6 +68,18 @@ def get_room_names():
     return list(ROOMS.keys())
 
 
+def get_room_id(room_name):
+    room_data = ROOMS.get(room_name)
+    return room_data["room_id"] if room_data else None
+
+
+def get_room_name(room_id):
+    for name, room_data in ROOMS.items():
+        if room_data["room_id"] == room_id:
+            return name
+    return None
+
+
 def get_all_topics():
     topics = []
     for room_name, room_data in ROOMS.items():
@@ -69,26 +88,171 @@ def get_all_topics():
     return topics
 
 
-def get_room_from_topic(topic):
-  
-    if topic in CUSTOM_TOPIC_MAP:
-        return CUSTOM_TOPIC_MAP[topic][0]
-    
-  
+# sensor type of a room's combined topic, whose messages carry every metric at once
+COMBINED = "all"
+
+
+def get_combined_topic(room_name):
+    room_data = ROOMS.get(room_name)
+    return room_data.get("combined") if room_data else None
+
+
+# Wildcard routes, MQTT syntax: '+' matches one level, '#' the rest of the topic.
+# Room/sensor are format strings filled with the matched levels, e.g.
+#   "pr/building1/+/+": ("{0}", "{1}")
+# routes pr/building1/lab3/temperature to room "lab3", sensor "temperature".
+# Explicit topics in ROOMS / CUSTOM_TOPIC_MAP always win over patterns.
+TOPIC_PATTERNS = {
+}
+
+
+# Payload schema per sensor type: metric -> payload key, or a tuple of keys tried in order.
+# A routed topic is parsed with the schema of its sensor type, so e.g. a
+# temperature topic only looks at the temperature keys.
+SENSOR_SCHEMAS = {
+    "temperature": {"temperature": payloads.METRIC_KEYS["temperature"]},
+    "humidity": {"humidity": payloads.METRIC_KEYS["humidity"]},
+    "light": {"lux": payloads.METRIC_KEYS["lux"]},
+    "lux": {"lux": payloads.METRIC_KEYS["lux"]},
+    # one message per room per tick: {"temperature": .., "humidity": .., "lux": .., "ts": ..}
+    COMBINED: {metric: metric for metric in payloads.METRIC_KEYS},
+}
+
+# Per-topic schemas, these win over SENSOR_SCHEMAS. Topics without any
+# schema (unrouted ones, unknown sensor types) get every known alias.
+PAYLOAD_SCHEMAS = {
+    # third-party device, its payload layout is not pinned down
+    "pr/home/5976397/sts": payloads.METRIC_KEYS,
+}
+
+
+class TopicRouter:
+    """Maps a topic to (room, sensor) with one dict lookup for known topics,
+    falling back to a topic trie for wildcard patterns."""
+
+    _LEAF = object()
+
+    def __init__(self, max_cache=10000):
+        self._exact = {}
+        self._trie = {}
+        self._cache = {}
+        self._max_cache = max_cache
+
+    def add(self, topic, room, sensor):
+        if '+' in topic or '#' in topic:
+            node = self._trie
+            for level in topic.split('/'):
+                node = node.setdefault(level, {})
+            node[self._LEAF] = (room, sensor)
+            self._cache.clear()
+        else:
+            self._exact[topic] = (room, sensor)
+
+    def route(self, topic):
+        hit = self._exact.get(topic)
+        if hit is not None:
+            return hit
+        hit = self._cache.get(topic)
+        if hit is not None:
+            return hit
+        hit = (None, None)
+        if self._trie:
+            match = self._match(self._trie, topic.split('/'), 0, [])
+            if match is not None:
+                (room, sensor), captures = match
+                hit = (room.format(*captures), sensor.format(*captures))
+        # pattern hits and misses are remembered so repeated topics stay O(1)
+        if len(self._cache) >= self._max_cache:
+            self._cache.clear()
+        self._cache[topic] = hit
+        return hit
+
+    def _match(self, node, levels, i, captures):
+        if i == len(levels):
+            if self._LEAF in node:
+                return node[self._LEAF], captures
+            # 'a/#' also matches 'a'
+            child = node.get('#')
+            if child is not None and self._LEAF in child:
+                return child[self._LEAF], captures + ['']
+            return None
+        child = node.get(levels[i])
+        if child is not None:
+            match = self._match(child, levels, i + 1, captures)
+            if match is not None:
+                return match
+        child = node.get('+')
+        if child is not None:
+            match = self._match(child, levels, i + 1, captures + [levels[i]])
+            if match is not None:
+                return match
+        child = node.get('#')
+        if child is not None and self._LEAF in child:
+            return child[self._LEAF], captures + ['/'.join(levels[i:])]
+        return None
+
+
+def build_router():
+    router = TopicRouter()
+    for pattern, (room_name, sensor_name) in TOPIC_PATTERNS.items():
+        router.add(pattern, room_name, sensor_name)
     for room_name, room_data in ROOMS.items():
-        for sensor_name, sensor_topic in room_data["sensors"].items():
-            if sensor_topic == topic:
-                return room_name
-    return None
+        for sensor_name, topic in room_data["sensors"].items():
+            router.add(topic, room_name, sensor_name)
+        if room_data.get("combined"):
+            router.add(room_data["combined"], room_name, COMBINED)
+    # custom entries override the generated ones
+    for topic, (room_name, sensor_name) in CUSTOM_TOPIC_MAP.items():
+        router.add(topic, room_name, sensor_name)
+    return router
+
+
+def build_extractors():
+    """Compile every schema once: (per topic, per sensor type) extractor dicts."""
+    by_topic = {topic: payloads.compile_schema(schema) for topic, schema in PAYLOAD_SCHEMAS.items()}
+    by_sensor = {sensor: payloads.compile_schema(schema) for sensor, schema in SENSOR_SCHEMAS.items()}
+    return by_topic, by_sensor
+
+
+_router = build_router()
+_topic_extractors, _sensor_extractors = build_extractors()
+
+
+def rebuild_routes():
+    """Call after changing ROOMS, CUSTOM_TOPIC_MAP, TOPIC_PATTERNS or the payload schemas at runtime."""
+    global _router, _topic_extractors, _sensor_extractors
+    _router = build_router()
+    _topic_extractors, _sensor_extractors = build_extractors()
+
+
+def route_topic(topic):
+    """Return (room_name, sensor_type) for a topic, (None, None) if unknown."""
+    return _router.route(topic)
+
+
+def get_extractor(topic, sensor_type=None):
+    """Compiled payload extractor for a topic (see PAYLOAD_SCHEMAS / SENSOR_SCHEMAS)."""
+    extractor = _topic_extractors.get(topic)
+    if extractor is None:
+        extractor = _sensor_extractors.get(sensor_type, payloads.extract_any)
+    return extractor
+
+
+def parse_message(topic, payload):
+    """Decode, route and extract one message in a single pass.
+
+    Returns (room_name, sensor_type, data, values); data is None and values
+    empty when the payload is not a JSON object."""
+    data = payloads.decode(payload)
+    if data is None:
+        return None, None, None, {}
+    room_name, sensor_type = _router.route(topic)
+    return room_name, sensor_type, data, get_extractor(topic, sensor_type)(data)
+
+
+def get_room_from_topic(topic):
+    return _router.route(topic)[0]
+
 
 def get_sensor_type_from_topic(topic):
-    
-    if topic in CUSTOM_TOPIC_MAP:
-        return CUSTOM_TOPIC_MAP[topic][1]
-    
-    
-    for room_name, room_data in ROOMS.items():
-        for sensor_name, sensor_topic in room_data["sensors"].items():
-            if sensor_topic == topic:
-                return sensor_name
-    return None
+    return _router.route(topic)[1]
@@ -1,49 +1,17 @@
 
 import paho.mqtt.client as mqtt
+import sys
 import time
 import json
 import random
-import math
-import socket
 import threading
 from PyQt5 import QtWidgets, QtCore
 
+import payloads
 import room_config
-
-nb = 1
-brokers = [str(socket.gethostbyname('vmm1.saaintertrade.com')), str(socket.gethostbyname('broker.hivemq.com'))]
-ports = ['80', '1883']
-usernames = ['MATZI', '']
-passwords = ['MATZI', '']
-
-broker_ip = brokers[nb]
-port = ports[nb]
-username = usernames[nb]
-password = passwords[nb]
-
-
-class SensorData:
-    """Generates realistic sensor values"""
-    def __init__(self):
-        self.time_offset = random.uniform(0, 10)
-        self.base_temp = 22
-        self.base_humidity = 50
-        self.base_lux = 800
-    
-    def get_temperature(self):
-        variation = 2 * math.sin(time.time() / 30 + self.time_offset)
-        noise = random.gauss(0, 0.3)
-        return round(self.base_temp + variation + noise, 1)
-    
-    def get_humidity(self):
-        variation = 8 * math.sin(time.time() / 40 + self.time_offset)
-        noise = random.gauss(0, 0.5)
-        return round(max(10, min(100, self.base_humidity + variation + noise)), 1)
-    
-    def get_light(self):
-        variation = self.base_lux * 0.3 * math.sin(time.time() / 60 + self.time_offset)
-        noise = random.gauss(0, self.base_lux * 0.05)
-        return round(max(0, self.base_lux + variation + noise), 0)
+import load_generator
+from broker_config import broker
+from load_generator import SensorData
 
 
 class SingleSensorGUI(QtWidgets.QMainWindow):
@@ -86,7 +54,7 @@ class SingleSensorGUI(QtWidgets.QMainWindow):
         layout.addWidget(title)
         
         
-        broker_info = QtWidgets.QLabel(f'📡 Broker: {broker_ip}:{port}')
+        broker_info = QtWidgets.QLabel(f'📡 Broker: {broker}')
         broker_info.setStyleSheet('color: #9fbfc0; font-size: 11px;')
         layout.addWidget(broker_info)
         
@@ -214,6 +182,15 @@ class SingleSensorGUI(QtWidgets.QMainWindow):
         layout.addWidget(lux_group)
         
         
+        self.binary_check = QtWidgets.QCheckBox("Compact binary payload (instead of JSON)")
+        self.binary_check.setChecked(False)
+        layout.addWidget(self.binary_check)
+        
+        self.combined_check = QtWidgets.QCheckBox("One combined message per room (all enabled sensors)")
+        self.combined_check.setChecked(False)
+        layout.addWidget(self.combined_check)
+        
+        
         controls = QtWidgets.QHBoxLayout()
         
         self.btn_connect = QtWidgets.QPushButton('Connect')
@@ -272,10 +249,11 @@ class SingleSensorGUI(QtWidgets.QMainWindow):
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
             
-            if username != "":
-                self.client.username_pw_set(username, password)
+            if broker.username != "":
+                self.client.username_pw_set(broker.username, broker.password)
             
-            self.client.connect(broker_ip, int(port))
+            # DNS and connect run on the network thread; _on_connect reports the result
+            self.client.connect_async(broker.host, broker.port)
             self.client.loop_start()
             self.append_log('🔄 Connecting to MQTT broker...')
         except Exception as e:
@@ -337,33 +315,47 @@ class SingleSensorGUI(QtWidgets.QMainWindow):
         self.btn_publish.setText('Start Publishing')
         self.append_log('⏹ Stopped publishing')
     
+    def encode_payload(self, values):
+        if self.binary_check.isChecked():
+            return payloads.encode_binary(values)
+        return json.dumps(values)
+    
     def _publish_loop(self):
         while self.is_publishing and self.is_connected:
             try:
+                # (metric, value, topic) of every enabled sensor this tick
+                readings = []
                 
                 if self.temp_check.isChecked() and self.temp_topic.text().strip():
                     value = self.sensor_data.get_temperature()
                     self.sensor_data.base_temp = self.temp_base.value()
-                    payload = json.dumps({"temperature": value})
-                    self.client.publish(self.temp_topic.text(), payload)
+                    readings.append(("temperature", value, self.temp_topic.text()))
                     self.temp_value.setText(f"{value} °C")
                 
                 
                 if self.hum_check.isChecked() and self.hum_topic.text().strip():
                     value = self.sensor_data.get_humidity()
                     self.sensor_data.base_humidity = self.hum_base.value()
-                    payload = json.dumps({"humidity": value})
-                    self.client.publish(self.hum_topic.text(), payload)
+                    readings.append(("humidity", value, self.hum_topic.text()))
                     self.hum_value.setText(f"{value} %")
                 
                 
                 if self.lux_check.isChecked() and self.lux_topic.text().strip():
                     value = self.sensor_data.get_light()
                     self.sensor_data.base_lux = self.lux_base.value()
-                    payload = json.dumps({"lux": value})
-                    self.client.publish(self.lux_topic.text(), payload)
+                    readings.append(("lux", value, self.lux_topic.text()))
                     self.lux_value.setText(f"{value} lux")
                 
+                combined_topic = room_config.get_combined_topic(self.room_combo.currentText())
+                if self.combined_check.isChecked() and combined_topic and readings:
+                    # one message for the whole room
+                    values = {metric: value for metric, value, _topic in readings}
+                    values["ts"] = round(time.time(), 3)
+                    self.client.publish(combined_topic, self.encode_payload(values))
+                else:
+                    for metric, value, topic in readings:
+                        self.client.publish(topic, self.encode_payload({metric: value}))
+                
             except Exception as e:
                 self.append_log(f'✗ Publish error: {e}')
             
@@ -371,6 +363,10 @@ class SingleSensorGUI(QtWidgets.QMainWindow):
 
 
 def main():
+    # "--headless [options]" runs the multi-room load generator instead of the window
+    if '--headless' in sys.argv[1:]:
+        load_generator.main([arg for arg in sys.argv[1:] if arg != '--headless'])
+        return
     app = QtWidgets.QApplication([])
     win = SingleSensorGUI()
     win.show()
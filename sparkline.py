@@ -0,0 +1,87 @@
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+
+class Sparkline(QtWidgets.QWidget):
+    """Small trend line of (ts, value) samples drawn with a single QPainter
+    polyline; the newest sample is at the right edge and `window_ms` of
+    history spans the width.
+
+    set_data() only stores the arrays and schedules a repaint, so the
+    owner decides how often that happens. More samples than pixel columns
+    are reduced to the min and max of each column, which keeps spikes."""
+
+    def __init__(self, window_ms=10 * 60 * 1000, color='#0f9f9a', alarm_color='#ff6b6b', parent=None):
+        super().__init__(parent)
+        self.window_ms = window_ms
+        self._pen = QtGui.QPen(QtGui.QColor(color), 1.5)
+        self._alarm_pen = QtGui.QPen(QtGui.QColor(alarm_color), 1.5)
+        self._threshold_pen = QtGui.QPen(QtGui.QColor(alarm_color), 1, QtCore.Qt.DashLine)
+        self._ts = ()
+        self._values = ()
+        self._threshold = None
+        # (size, polygon, y mapping) of the last paint, reused until data or size change
+        self._cached = None
+        self.setMinimumHeight(30)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+
+    def set_data(self, ts, values, threshold=None):
+        self._ts = ts
+        self._values = values
+        self._threshold = threshold
+        self._cached = None
+        self.update()
+
+    def _points(self, width, height):
+        ts, values = self._ts, self._values
+        end = ts[-1]
+        start = end - self.window_ms
+        vmin, vmax = min(values), max(values)
+        span = vmax - vmin
+        thr = self._threshold
+        if thr is not None and vmin - span <= thr <= vmax + span:
+            # keep a nearby threshold in view so the line can be read against it
+            vmin, vmax = min(vmin, thr), max(vmax, thr)
+        span = (vmax - vmin) or 1.0
+        x_scale = (width - 1) / self.window_ms
+        y_scale = (height - 3) / span
+
+        def y(v):
+            return height - 2 - (v - vmin) * y_scale
+
+        points = []
+        column = None
+        lo = hi = 0.0
+        for t, v in zip(ts, values):
+            if t < start:
+                continue
+            x = int((t - start) * x_scale)
+            if x != column:
+                if column is not None:
+                    points += (QtCore.QPointF(column, y(lo)), QtCore.QPointF(column, y(hi)))
+                column, lo, hi = x, v, v
+            elif v < lo:
+                lo = v
+            elif v > hi:
+                hi = v
+        if column is not None:
+            points += (QtCore.QPointF(column, y(lo)), QtCore.QPointF(column, y(hi)))
+        return QtGui.QPolygonF(points), y
+
+    def paintEvent(self, event):
+        if len(self._values) < 2:
+            return
+        width, height = self.width(), self.height()
+        if self._cached is None or self._cached[0] != (width, height):
+            self._cached = ((width, height),) + self._points(width, height)
+        _size, polygon, y = self._cached
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        if self._threshold is not None:
+            ty = y(self._threshold)
+            if 0 <= ty <= height:
+                painter.setPen(self._threshold_pen)
+                painter.drawLine(QtCore.QPointF(0, ty), QtCore.QPointF(width, ty))
+        high = self._threshold is not None and self._values[-1] >= self._threshold
+        painter.setPen(self._alarm_pen if high else self._pen)
+        painter.drawPolyline(polygon)
+        painter.end()
@@ -0,0 +1,415 @@
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import metrics
+import room_config
+
+
+DB_PATH = 'sensor_data.db'
+
+# Bumped whenever ensure_schema() gains a migration step (stored in PRAGMA user_version)
+SCHEMA_VERSION = 2
+
+# Rollup tables and their bucket width in milliseconds
+ROLLUPS = (
+    ('rollup_1m', 60 * 1000),
+    ('rollup_1h', 3600 * 1000),
+)
+
+# Larger than any rowid, used as an open upper bound for keyset paging
+MAX_ID = 2 ** 63 - 1
+
+# Queue markers understood by the writer thread
+_STOP = object()
+
+
+def connect(db_path=DB_PATH):
+    """Open a connection tuned for one writer and many readers."""
+    conn = sqlite3.connect(db_path)
+    # lets retention.RetentionJob give deleted pages back to the file system; only
+    # takes on a new file and before WAL is switched on, existing files are
+    # converted by enable_incremental_vacuum()
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    # in WAL mode NORMAL only fsyncs on checkpoint, which is what makes batching pay off
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def ensure_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT,
+            topic TEXT,
+            payload TEXT
+        )
+    ''')
+    # One row per numeric value, parsed once at ingest.
+    # ts is epoch milliseconds, sensor is the metric name ('temperature', 'humidity', 'lux').
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            room_id INTEGER,
+            sensor TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_readings_room_sensor_ts ON readings (room_id, sensor, ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_readings_sensor_ts ON readings (sensor, ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_readings_message ON readings (message_id)')
+    # Per room/sensor aggregates kept up to date by DbWriter; bucket is the
+    # bucket start in epoch ms, room_id 0 collects readings from unknown rooms.
+    for table, _width in ROLLUPS:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                room_id INTEGER NOT NULL,
+                sensor TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                total REAL NOT NULL,
+                min_value REAL NOT NULL,
+                max_value REAL NOT NULL,
+                PRIMARY KEY (room_id, sensor, bucket)
+            ) WITHOUT ROWID
+        ''')
+
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1:
+        _backfill_readings(conn)
+    if version < 2:
+        _backfill_rollups(conn)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+
+def enable_incremental_vacuum(conn):
+    """Switch an existing database to auto_vacuum=INCREMENTAL, so RetentionJob
+    can shrink the file. This rebuilds the whole file with VACUUM and locks it
+    for as long as that takes, so it is a one-time step run with nothing else
+    writing (python retention.py). Returns False if there was nothing to do."""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.commit()
+    conn.execute('VACUUM')
+    return True
+
+
+def _backfill_readings(conn, chunk=5000):
+    # one-time migration: parse the JSON payloads stored before the readings table existed
+    conn.execute('DELETE FROM readings')
+    last_id = 0
+    while True:
+        rows = conn.execute('SELECT id, ts, topic, payload FROM messages WHERE id > ? ORDER BY id LIMIT ?',
+                            (last_id, chunk)).fetchall()
+        if not rows:
+            break
+        readings = []
+        for msg_id, ts, topic, payload in rows:
+            # the same per-topic parsing as live ingest (IngestService.handle_message)
+            room_name, _sensor_type, _data, values = room_config.parse_message(topic, payload)
+            if not values:
+                continue
+            try:
+                ts_ms = int(datetime.fromisoformat(ts).timestamp() * 1000)
+            except (TypeError, ValueError):
+                continue
+            room_id = room_config.get_room_id(room_name)
+            for sensor, value in values.items():
+                readings.append((msg_id, ts_ms, room_id, sensor, value))
+        conn.executemany('INSERT INTO readings (message_id, ts, room_id, sensor, value) VALUES (?, ?, ?, ?, ?)',
+                         readings)
+        last_id = rows[-1][0]
+
+
+def _backfill_rollups(conn):
+    for table, width in ROLLUPS:
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'''
+            INSERT INTO {table} (room_id, sensor, bucket, count, total, min_value, max_value)
+            SELECT COALESCE(room_id, 0), sensor, ts - ts % {width}, COUNT(*), SUM(value), MIN(value), MAX(value)
+            FROM readings
+            GROUP BY 1, 2, 3
+        ''')
+
+
+def _update_rollups(conn, readings):
+    # fold the batch in Python first so each bucket costs one upsert per batch
+    for table, width in ROLLUPS:
+        buckets = {}
+        for _msg_id, ts, room_id, sensor, value in readings:
+            key = (room_id or 0, sensor, ts - ts % width)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                if value < agg[2]:
+                    agg[2] = value
+                if value > agg[3]:
+                    agg[3] = value
+        conn.executemany(f'''
+            INSERT INTO {table} (room_id, sensor, bucket, count, total, min_value, max_value)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (room_id, sensor, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                total = total + excluded.total,
+                min_value = MIN(min_value, excluded.min_value),
+                max_value = MAX(max_value, excluded.max_value)
+        ''', [key + tuple(agg) for key, agg in buckets.items()])
+
+
+def _last_message_id(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM messages').fetchone()[0]
+    return max(row[0] if row else 0, max_id)
+
+
+def fetch_recent_messages(conn, limit, before_id=None):
+    """Newest messages first, with their parsed readings pivoted into
+    (id, ts, topic, temperature, humidity, lux, payload) rows.
+    Pass the last id of the previous page as `before_id` to page backwards."""
+    if before_id is None:
+        before_id = MAX_ID
+    return conn.execute('''
+        SELECT m.id, m.ts, m.topic,
+               MAX(CASE WHEN r.sensor = 'temperature' THEN r.value END),
+               MAX(CASE WHEN r.sensor = 'humidity' THEN r.value END),
+               MAX(CASE WHEN r.sensor = 'lux' THEN r.value END),
+               m.payload
+        FROM (SELECT id, ts, topic, payload FROM messages WHERE id < ? ORDER BY id DESC LIMIT ?) AS m
+        LEFT JOIN readings AS r ON r.message_id = m.id
+        GROUP BY m.id
+        ORDER BY m.id DESC
+    ''', (before_id, limit)).fetchall()
+
+
+def _reading_filters(room_ids, since_ms, until_ms):
+    # predicates the (room_id, sensor, ts) / (sensor, ts) indexes can answer;
+    # room_ids None means every room, a None entry the readings of no room
+    where, params = [], []
+    if room_ids is not None:
+        where.append('(' + ' OR '.join(['room_id IS ?'] * len(room_ids)) + ')')
+        params += room_ids
+    if since_ms is not None:
+        where.append('ts >= ?')
+        params.append(since_ms)
+    if until_ms is not None:
+        where.append('ts < ?')
+        params.append(until_ms)
+    return ''.join(' AND ' + w for w in where), params
+
+
+def fetch_sensor_messages(conn, sensor, limit, before=None, room_ids=None, since_ms=None, until_ms=None):
+    """Newest messages with a `sensor` reading in the given rooms and time
+    range, pivoted like fetch_recent_messages, with the (ts, id) of that
+    reading appended. Pass those two of the last row of the previous page
+    as `before` to page backwards."""
+    extra, params = _reading_filters(room_ids, since_ms, until_ms)
+    if before is not None:
+        extra += ' AND (ts, id) < (?, ?)'
+        params += before
+    return conn.execute(f'''
+        SELECT m.id, m.ts, m.topic,
+               MAX(CASE WHEN r.sensor = 'temperature' THEN r.value END),
+               MAX(CASE WHEN r.sensor = 'humidity' THEN r.value END),
+               MAX(CASE WHEN r.sensor = 'lux' THEN r.value END),
+               m.payload, p.ts, p.id
+        FROM (SELECT id, message_id, ts FROM readings WHERE sensor = ?{extra}
+              ORDER BY ts DESC, id DESC LIMIT ?) AS p
+        JOIN messages AS m ON m.id = p.message_id
+        LEFT JOIN readings AS r ON r.message_id = m.id
+        GROUP BY p.id
+        ORDER BY p.ts DESC, p.id DESC
+    ''', [sensor] + params + [limit]).fetchall()
+
+
+def fetch_series(conn, sensor, limit, room_ids=None, since_ms=None, until_ms=None):
+    """Last `limit` (message_id, ts, value) readings of one sensor type, oldest first."""
+    extra, params = _reading_filters(room_ids, since_ms, until_ms)
+    rows = conn.execute(f'SELECT message_id, ts, value FROM readings WHERE sensor = ?{extra} ORDER BY ts DESC LIMIT ?',
+                        [sensor] + params + [limit]).fetchall()
+    rows.reverse()
+    return rows
+
+
+def fetch_latest(conn, room_id, sensor):
+    """Most recent value of one room's sensor, or None."""
+    row = conn.execute('SELECT value FROM readings WHERE room_id = ? AND sensor = ? ORDER BY ts DESC LIMIT 1',
+                       (room_id, sensor)).fetchone()
+    return row[0] if row else None
+
+
+def rollup_stats(conn, since_ms=None, room_id=None, until_ms=None):
+    """Aggregate the rollups into {sensor: (count, min, max, avg)}.
+
+    Ranges longer than a day are answered from the hourly table, so the
+    range is widened to whole buckets of that size."""
+    end_ms = int(time.time() * 1000) if until_ms is None else until_ms
+    long_range = since_ms is None or end_ms - since_ms > 24 * 3600 * 1000
+    table, width = ROLLUPS[1] if long_range else ROLLUPS[0]
+    where = []
+    params = []
+    if since_ms is not None:
+        where.append('bucket >= ?')
+        params.append(since_ms - since_ms % width)
+    if room_id is not None:
+        where.append('room_id = ?')
+        params.append(room_id)
+    if until_ms is not None:
+        where.append('bucket < ?')
+        params.append(until_ms)
+    sql = f'SELECT sensor, SUM(count), MIN(min_value), MAX(max_value), SUM(total) FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' GROUP BY sensor'
+    stats = {}
+    for sensor, count, vmin, vmax, total in conn.execute(sql, params):
+        stats[sensor] = (count, vmin, vmax, total / count)
+    return stats
+
+
+
+def raw_readings_start(conn, sensor):
+    """Epoch ms from which the raw readings of `sensor` are complete, when
+    older ones were expired (retention.RetentionJob) while their hourly
+    rollups were kept; None when the raw readings reach back as far as the
+    rollups do."""
+    table, width = ROLLUPS[1]
+    first_raw = conn.execute('SELECT MIN(ts) FROM readings WHERE sensor = ?', (sensor,)).fetchone()[0]
+    first_bucket, last_bucket = conn.execute(f'SELECT MIN(bucket), MAX(bucket) FROM {table} WHERE sensor = ?',
+                                             (sensor,)).fetchone()
+    if first_bucket is None:
+        return None
+    if first_raw is None:
+        # all of them expired
+        return last_bucket + width
+    return first_raw if first_raw >= first_bucket + width else None
+
+class DbWriter(threading.Thread):
+    """Write-behind writer: messages are queued from any thread and flushed
+    by this thread in a single transaction once `batch_size` rows are waiting
+    or the oldest waiting row is `max_age` seconds old."""
+
+    def __init__(self, db_path=DB_PATH, batch_size=500, max_age=0.5, on_error=None, registry=None):
+        super().__init__(name='DbWriter', daemon=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.on_error = on_error
+        self._queue = queue.Queue()
+        registry = metrics.REGISTRY if registry is None else registry
+        self._write_time = registry.histogram('smarthome_db_write_seconds', 'Time to commit one batch')
+        self._written = registry.counter('smarthome_db_messages_written_total', 'Messages committed to the database')
+        self._write_errors = registry.counter('smarthome_db_write_errors_total', 'Batches that failed to commit')
+        registry.gauge('smarthome_db_queue_depth', 'Messages and markers waiting for the writer thread',
+                       fn=self._queue.qsize)
+
+    def put(self, topic, payload, room_id=None, values=None, now=None):
+        """Queue a raw message plus the metric values already parsed from it,
+        received at `now` (epoch seconds, default the current time)."""
+        if now is None:
+            now = time.time()
+        self._queue.put((datetime.fromtimestamp(now).isoformat(), int(now * 1000), topic, payload,
+                         room_id, values))
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far has been committed."""
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Flush the remaining rows and close the connection."""
+        if self.is_alive():
+            self._queue.put(_STOP)
+            self.join(timeout)
+
+    def run(self):
+        conn = connect(self.db_path)
+        try:
+            ensure_schema(conn)
+            batch = []
+            deadline = 0.0
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if batch else None
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    # age limit reached
+                    self._write(conn, batch)
+                    batch = []
+                    continue
+
+                if item is _STOP:
+                    self._write(conn, batch)
+                    break
+                if isinstance(item, threading.Event):
+                    self._write(conn, batch)
+                    batch = []
+                    item.set()
+                    continue
+
+                if not batch:
+                    deadline = time.monotonic() + self.max_age
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._write(conn, batch)
+                    batch = []
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            self._insert(conn, batch)
+        except sqlite3.IntegrityError as e:
+            # one bad row must not cost the whole batch: retry message by message
+            failed = 0
+            for item in batch:
+                try:
+                    self._insert(conn, [item])
+                except sqlite3.Error:
+                    failed += 1
+            self._write_errors.inc()
+            self._written.inc(len(batch) - failed)
+            if self.on_error:
+                self.on_error(f'DB write: {failed} of {len(batch)} rows rejected ({e})')
+        except sqlite3.Error as e:
+            self._write_errors.inc()
+            if self.on_error:
+                self.on_error(f'DB write of {len(batch)} rows failed: {e}')
+        else:
+            self._write_time.observe(time.perf_counter() - start)
+            self._written.inc(len(batch))
+
+    def _insert(self, conn, batch):
+        with conn:
+            # take the write lock before reading the last id: another writer on the
+            # same file (a second GUI, ingest_service.py) can't hand out the same ids,
+            # and the readings rows can still reference them in one executemany
+            conn.execute('BEGIN IMMEDIATE')
+            msg_id = _last_message_id(conn) + 1
+            messages = []
+            readings = []
+            for ts, ts_ms, topic, payload, room_id, values in batch:
+                messages.append((msg_id, ts, topic, payload))
+                if values:
+                    for sensor, value in values.items():
+                        readings.append((msg_id, ts_ms, room_id, sensor, value))
+                msg_id += 1
+            conn.executemany('INSERT INTO messages (id, ts, topic, payload) VALUES (?, ?, ?, ?)', messages)
+            conn.executemany('INSERT INTO readings (message_id, ts, room_id, sensor, value) VALUES (?, ?, ?, ?, ?)',
+                             readings)
+            _update_rollups(conn, readings)
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from alarms import AlarmEngine
+from recent_history import RecentHistory
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _engine(**kwargs):
+    clock = FakeClock()
+    engine = AlarmEngine({'temperature': 50.0}, {'temperature': 2.0}, cooldown=60.0, clock=clock, **kwargs)
+    return engine, clock
+
+
+def _kinds(engine, source, values):
+    return [event.kind if event else None for event in (engine.update(source, 'temperature', v) for v in values)]
+
+
+def test_raises_once_and_clears_below_the_hysteresis_band():
+    engine, _clock = _engine()
+    assert _kinds(engine, 'Kitchen', [40, 50, 55, 49, 48.5, 51, 47.9, 45]) == \
+        [None, 'raised', None, None, None, None, 'cleared', None]
+    assert engine.active() == []
+
+
+def test_sources_are_independent():
+    engine, _clock = _engine()
+    assert engine.update('Kitchen', 'temperature', 60).kind == 'raised'
+    assert engine.update('Garage', 'temperature', 60).kind == 'raised'
+    assert sorted(engine.active()) == [('Garage', 'temperature'), ('Kitchen', 'temperature')]
+    assert engine.update('Kitchen', 'humidity', 100) is None
+
+
+def test_flapping_is_announced_once_per_cooldown():
+    engine, clock = _engine()
+    assert _kinds(engine, 'Kitchen', [60, 40]) == ['raised', 'cleared']
+    clock.now = 10
+    # high again inside the cooldown: tracked, but silent, and so is its clear
+    assert _kinds(engine, 'Kitchen', [60]) == [None]
+    assert engine.active() == [('Kitchen', 'temperature')]
+    assert _kinds(engine, 'Kitchen', [40, 60]) == [None, None]
+    # still high once the cooldown is over: announced now
+    clock.now = 61
+    assert _kinds(engine, 'Kitchen', [60, 60, 40]) == ['raised', None, 'cleared']
+
+
+def test_hold_needs_recent_readings():
+    with pytest.raises(ValueError):
+        AlarmEngine(hold=10)
+
+
+def test_hold_waits_until_the_value_stayed_high():
+    recent = RecentHistory()
+    engine, _clock = _engine(hold=8, recent=recent)
+    now_ms = int(time.time() * 1000)
+
+    def check(source, history, value):
+        # earlier readings are only in memory, the current one is fed to the engine too
+        for seconds_ago, old in history:
+            recent.add(source, {'temperature': old}, ts=now_ms - seconds_ago * 1000)
+        recent.add(source, {'temperature': value}, ts=now_ms)
+        event = engine.update(source, 'temperature', value)
+        return event.kind if event else None
+
+    # high for only part of the hold time
+    assert check('a', [(10, 40), (5, 60)], 60) is None
+    # high for the whole hold time, including the reading before the window
+    assert check('b', [(10, 60), (5, 60)], 60) == 'raised'
+    # a single reading can't tell how long the value has been high
+    assert check('c', [], 60) is None
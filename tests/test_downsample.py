@@ -0,0 +1,63 @@
+import numpy as np
+
+from downsample import lttb
+
+
+def _reference(x, y, n_out):
+    # straightforward LTTB, one bucket at a time
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    keep = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        if i == n_out - 3:
+            nx, ny = x[-1], y[-1]
+        else:
+            nx, ny = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(area.argmax())
+        keep.append(a)
+    keep.append(n - 1)
+    return x[keep], y[keep]
+
+
+def test_small_input_is_returned_unchanged():
+    x = np.arange(10.0)
+    y = np.sin(x)
+    xs, ys = lttb(x, y, 10)
+    assert np.array_equal(xs, x) and np.array_equal(ys, y)
+    xs, _ys = lttb(x, y, 2)
+    assert len(xs) == 10
+
+
+def test_keeps_endpoints_order_and_size():
+    rng = np.random.default_rng(1)
+    x = np.arange(10000.0)
+    y = rng.normal(size=10000).cumsum()
+    xs, ys = lttb(x, y, 500)
+    assert len(xs) == 500
+    assert xs[0] == 0 and xs[-1] == 9999
+    assert np.all(np.diff(xs) > 0)
+    # every kept point is a real sample
+    assert np.array_equal(ys, y[xs.astype(int)])
+
+
+def test_keeps_a_single_spike():
+    x = np.arange(5000.0)
+    y = np.zeros(5000)
+    y[2345] = 100.0
+    _xs, ys = lttb(x, y, 100)
+    assert ys.max() == 100.0
+
+
+def test_matches_the_reference_implementation():
+    rng = np.random.default_rng(7)
+    x = np.arange(1000.0)
+    y = rng.normal(size=1000)
+    for n_out in (3, 10, 99, 500):
+        xs, ys = lttb(x, y, n_out)
+        rx, ry = _reference(x, y, n_out)
+        assert np.array_equal(xs, rx) and np.array_equal(ys, ry)
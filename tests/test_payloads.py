@@ -0,0 +1,73 @@
+import math
+import struct
+
+import payloads
+import room_config
+
+
+def test_binary_round_trip():
+    values = {'temperature': 21.5, 'humidity': 40.25, 'lux': 300.0}
+    data = payloads.encode_binary(values)
+    assert payloads.is_binary(data)
+    assert len(data) == 1 + 9 * 3
+    assert payloads.decode_binary(data) == values
+    single = payloads.encode_binary({'temperature': 24.68})
+    assert len(single) == 10
+    assert payloads.decode(single) == {'temperature': 24.68}
+    assert payloads.to_text(payloads.encode_binary({'lux': 5.0})) == 'bin {"lux": 5.0}'
+    assert not payloads.is_binary(b'{"lux": 5.0}')
+
+
+def test_binary_skips_unknown_codes_and_rejects_bad_lengths():
+    data = struct.pack('<BBdBd', 1, 99, 1.0, 2, 50.0)
+    assert payloads.decode_binary(data) == {'humidity': 50.0}
+    assert payloads.decode_binary(struct.pack('<BBd', 1, 99, 1.0)) == {}
+    assert payloads.decode_binary(data[:-1]) is None
+    assert payloads.decode_binary(bytes([1])) is None
+    # metrics without a code are left out when encoding
+    assert payloads.decode_binary(payloads.encode_binary({'co2': 1.0, 'lux': 2.0})) == {'lux': 2.0}
+
+
+def test_binary_drops_non_finite_values():
+    for bad in (math.nan, math.inf, -math.inf):
+        assert payloads.decode_binary(struct.pack('<BBd', 1, 1, bad)) == {}
+        assert payloads.decode_binary(struct.pack('<BBdBd', 1, 1, bad, 2, 50.0)) == {'humidity': 50.0}
+
+
+def test_decode_accepts_only_json_objects():
+    assert payloads.decode('{"temperature": 20}') == {'temperature': 20}
+    assert payloads.decode(b'{"temperature": 20}') == {'temperature': 20}
+    assert payloads.decode('[1, 2]') is None
+    assert payloads.decode('not json') is None
+
+
+def test_non_finite_values_are_not_readings():
+    for raw in ('nan', 'NaN', 'inf', '-Infinity', 10 ** 400, float('nan'), float('inf')):
+        assert payloads.extract_values({'temperature': raw}) == {}
+    # the single-key fast path of a routed topic
+    extract = payloads.compile_schema({'temperature': 'temperature'})
+    assert extract({'temperature': float('nan')}) == {}
+    assert extract({'temperature': 'nan'}) == {}
+    assert extract({'temperature': 21}) == {'temperature': 21.0}
+    assert room_config.parse_message('pr/home/room1/temperature', '{"temperature": "nan"}')[3] == {}
+    # the NaN literal: orjson rejects it, the json module fallback parses it
+    assert room_config.parse_message('pr/home/room1/temperature', b'{"temperature": NaN}')[3] == {}
+
+
+def test_extractors_follow_the_schema():
+    assert payloads.extract_values({'Humidity (%)': '45%', 'light': '300', 'temp': None}) == \
+        {'humidity': 45.0, 'lux': 300.0}
+    extract = payloads.compile_schema({'temperature': ('temperature', 'temp'), 'lux': 'lux'})
+    # the first key present is used, even when its value is unusable
+    assert extract({'temperature': 'bad', 'temp': 20.0, 'lux': 1}) == {'lux': 1.0}
+    assert extract({'temp': 20.0}) == {'temperature': 20.0}
+    assert room_config.parse_message('pr/home/room1/temperature', '{"temp": "21.5"}')[3] == {'temperature': 21.5}
+
+
+def test_combined_message_carries_every_metric():
+    room, sensor, data, values = room_config.parse_message('pr/home/room2/all',
+                                                           '{"temperature": 20, "humidity": 30, "lux": 40}')
+    assert (room, sensor, values) == ('Bedroom', 'all', {'temperature': 20.0, 'humidity': 30.0, 'lux': 40.0})
+    # the sample time travels along in binary payloads too
+    binary = payloads.encode_binary({'temperature': 20.0, 'ts': 1700000000.5})
+    assert payloads.decode_binary(binary) == {'temperature': 20.0, 'ts': 1700000000.5}
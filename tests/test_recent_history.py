@@ -0,0 +1,64 @@
+from recent_history import RecentHistory, RingBuffer
+
+
+def _filled(capacity, count):
+    buf = RingBuffer(capacity)
+    for i in range(count):
+        buf.append(i * 10, float(i))
+    return buf
+
+
+def test_ring_buffer_keeps_the_newest_samples_in_order():
+    for capacity in (1, 2, 5):
+        for count in range(0, 3 * capacity + 2):
+            buf = _filled(capacity, count)
+            kept = list(range(max(0, count - capacity), count))
+            assert len(buf) == len(kept)
+            ts, values = buf.since(0)
+            assert list(ts) == [i * 10 for i in kept]
+            assert list(values) == [float(i) for i in kept]
+            assert buf.oldest() == (kept[0] * 10 if kept else None)
+            assert buf.latest() == ((kept[-1] * 10, float(kept[-1])) if kept else None)
+
+
+def test_ring_buffer_since_after_wraparound():
+    buf = _filled(5, 13)  # holds 8..12, physically wrapped
+    for since, expected in ((0, [8, 9, 10, 11, 12]), (85, [9, 10, 11, 12]), (90, [9, 10, 11, 12]),
+                            (120, [12]), (121, [])):
+        ts, values = buf.since(since)
+        assert list(ts) == [i * 10 for i in expected]
+        assert list(values) == [float(i) for i in expected]
+
+
+def test_ring_buffer_since_previous_adds_the_sample_before():
+    buf = _filled(5, 13)
+    ts, _values = buf.since(105, previous=True)
+    assert list(ts) == [100, 110, 120]
+    # nothing before the oldest held sample
+    ts, _values = buf.since(80, previous=True)
+    assert list(ts) == [80, 90, 100, 110, 120]
+
+
+def test_recent_history_window_and_covers():
+    recent = RecentHistory(capacity=4)
+    for i in range(6):
+        recent.add('Kitchen', {'temperature': 20.0 + i, 'humidity': 50.0}, ts=1000 * i)
+    ts, values = recent.window('Kitchen', 'temperature', since_ms=3000)
+    assert list(ts) == [3000, 4000, 5000]
+    assert list(values) == [23.0, 24.0, 25.0]
+    ts, _values = recent.window('Kitchen', 'temperature', since_ms=3500, until_ms=5000, previous=True)
+    assert list(ts) == [3000, 4000]
+    assert recent.latest('Kitchen', 'humidity') == (5000, 50.0)
+    # samples 0 and 1 fell out of the buffer
+    assert recent.covers('Kitchen', 'temperature', 2000)
+    assert not recent.covers('Kitchen', 'temperature', 1000)
+    assert len(recent.window('Garage', 'temperature')[0]) == 0
+
+
+def test_recent_history_limits_the_number_of_series():
+    recent = RecentHistory(capacity=4, max_series=2)
+    recent.add('a', {'temperature': 1.0, 'humidity': 2.0}, ts=1)
+    recent.add('b', {'temperature': 3.0}, ts=2)
+    assert sorted(recent.series()) == [('a', 'humidity'), ('a', 'temperature')]
+    recent.add('a', {'temperature': 4.0}, ts=3)
+    assert recent.latest('a', 'temperature') == (3, 4.0)
@@ -0,0 +1,76 @@
+import gzip
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+import storage
+from retention import DAY_MS, RetentionJob
+
+
+def _fill(db_path, now):
+    # one message an hour for the last 10 days, stored like a database from
+    # before the readings table; ensure_schema() migrates it
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, topic TEXT, payload TEXT)')
+    conn.executemany('INSERT INTO messages (ts, topic, payload) VALUES (?, ?, ?)',
+                     [(datetime.fromtimestamp(now - hours_ago * 3600).isoformat(), 'pr/home/room1/temperature',
+                       '{"temperature": 20}') for hours_ago in range(240, 0, -1)])
+    conn.commit()
+    conn.close()
+    conn = storage.connect(str(db_path))
+    storage.ensure_schema(conn)
+    conn.close()
+
+
+def test_expires_old_messages_in_batches_and_archives_them(tmp_path):
+    now = time.time()
+    db = tmp_path / 'a.db'
+    _fill(db, now)
+    archive = tmp_path / 'archive'
+    conn = storage.connect(str(db))
+    assert storage.raw_readings_start(conn, 'temperature') is None
+    conn.close()
+    job = RetentionJob(str(db), raw_days=7, rollup_days={}, archive_dir=str(archive), batch_size=7, pause=0)
+    deleted = job.run_once(now)
+    # 240 hourly messages, the 3 days beyond the 7 kept
+    assert deleted == {'messages': 72}
+
+    conn = storage.connect(str(db))
+    cutoff_ms = int((now - 7 * 86400) * 1000)
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone() == (168,)
+    assert conn.execute('SELECT COUNT(*), MIN(ts) >= ? FROM readings', (cutoff_ms,)).fetchone() == (168, 1)
+    # rollups outlive the raw rows
+    assert conn.execute('SELECT SUM(count) FROM rollup_1h').fetchone() == (240,)
+    assert storage.raw_readings_start(conn, 'temperature') == conn.execute('SELECT MIN(ts) FROM readings').fetchone()[0]
+    assert storage.raw_readings_start(conn, 'humidity') is None
+    conn.close()
+
+    records = []
+    for path in sorted(archive.iterdir()):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records += [json.loads(line) for line in f]
+    assert len(records) == 72
+    assert len({r['id'] for r in records}) == 72
+    assert records[0]['values'] == {'temperature': 20.0} and records[0]['room_id'] == 1
+    assert all(path.name.startswith('messages-') for path in archive.iterdir())
+
+    # nothing left to do on the next pass
+    assert job.run_once(now) == {'messages': 0}
+
+
+def test_expires_rollups_per_table(tmp_path):
+    now = time.time()
+    db = tmp_path / 'a.db'
+    _fill(db, now)
+    job = RetentionJob(str(db), raw_days=None, rollup_days={'rollup_1m': 2, 'rollup_1h': None},
+                       batch_size=5, pause=0)
+    deleted = job.run_once(now)
+    assert set(deleted) == {'rollup_1m'}
+    conn = storage.connect(str(db))
+    cutoff = int(now * 1000) - 2 * DAY_MS
+    assert conn.execute('SELECT COUNT(*) FROM rollup_1m WHERE bucket < ?', (cutoff,)).fetchone() == (0,)
+    assert conn.execute('SELECT COUNT(*) FROM rollup_1m').fetchone()[0] == 240 - deleted['rollup_1m']
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone() == (240,)
+    assert conn.execute('SELECT SUM(count) FROM rollup_1h').fetchone() == (240,)
+    conn.close()
@@ -0,0 +1,110 @@
+import math
+import sqlite3
+
+import room_config
+import storage
+
+
+def _writer(db_path, errors=None, **kwargs):
+    writer = storage.DbWriter(str(db_path), on_error=None if errors is None else errors.append, **kwargs)
+    writer.start()
+    return writer
+
+
+def _count(db_path, sql):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return conn.execute(sql).fetchone()
+    finally:
+        conn.close()
+
+
+def test_batch_is_stored_with_readings_and_rollups(tmp_path):
+    db = tmp_path / 'a.db'
+    writer = _writer(db)
+    for i in range(10):
+        writer.put('pr/home/room1/all', '{}', 1, {'temperature': 20.0 + i, 'humidity': 50.0})
+    writer.stop()
+    assert _count(db, 'SELECT COUNT(*) FROM messages') == (10,)
+    assert _count(db, 'SELECT COUNT(*), COUNT(DISTINCT message_id) FROM readings') == (20, 10)
+    assert _count(db, "SELECT MIN(value), MAX(value) FROM readings WHERE sensor = 'temperature'") == (20.0, 29.0)
+    for table, _width in storage.ROLLUPS:
+        assert _count(db, f"SELECT SUM(count), MIN(min_value), MAX(max_value), SUM(total) FROM {table} "
+                          "WHERE sensor = 'temperature'") == (10, 20.0, 29.0, 245.0)
+
+
+def test_a_nan_reading_only_loses_its_own_message(tmp_path):
+    db = tmp_path / 'a.db'
+    errors = []
+    writer = _writer(db, errors)
+    for i in range(5):
+        writer.put('pr/home/room1/temperature', 'x', 1, {'temperature': math.nan if i == 2 else float(i)})
+    assert writer.flush()
+    writer.stop()
+    assert _count(db, 'SELECT COUNT(*) FROM messages') == (4,)
+    assert _count(db, 'SELECT COUNT(*) FROM readings') == (4,)
+    assert len(errors) == 1 and '1 of 5' in errors[0]
+
+
+def test_two_writers_on_one_database(tmp_path):
+    db = tmp_path / 'a.db'
+    errors = []
+    first = _writer(db, errors, max_age=0.01)
+    second = _writer(db, errors, max_age=0.01)
+    for i in range(1000):
+        (first if i % 2 else second).put('t', str(i), 1, {'lux': float(i)})
+        if i % 100 == 0:
+            first.flush()
+            second.flush()
+    first.stop()
+    second.stop()
+    assert errors == []
+    assert _count(db, 'SELECT COUNT(*), COUNT(DISTINCT id) FROM messages') == (1000, 1000)
+    # readings still belong to the message they were parsed from
+    assert _count(db, 'SELECT COUNT(*) FROM readings r JOIN messages m ON m.id = r.message_id '
+                      'WHERE CAST(m.payload AS REAL) = r.value') == (1000,)
+
+
+def test_new_databases_use_incremental_vacuum(tmp_path):
+    conn = storage.connect(str(tmp_path / 'new.db'))
+    storage.ensure_schema(conn)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone() == (2,)
+    assert storage.enable_incremental_vacuum(conn) is False
+    conn.close()
+
+    old = sqlite3.connect(str(tmp_path / 'old.db'))
+    old.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, topic TEXT, payload TEXT)')
+    old.execute("INSERT INTO messages (ts, topic, payload) VALUES ('2024-01-01T00:00:00', 't', '{\"lux\": 5}')")
+    old.commit()
+    old.close()
+    conn = storage.connect(str(tmp_path / 'old.db'))
+    storage.ensure_schema(conn)
+    # existing files are left alone until converted explicitly
+    assert conn.execute('PRAGMA auto_vacuum').fetchone() == (0,)
+    assert conn.execute('SELECT COUNT(*) FROM readings').fetchone() == (1,)
+    assert storage.enable_incremental_vacuum(conn) is True
+    assert conn.execute('PRAGMA auto_vacuum').fetchone() == (2,)
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone() == (1,)
+    conn.close()
+
+
+def test_migration_parses_like_live_ingest(tmp_path):
+    db = tmp_path / 'old.db'
+    old = sqlite3.connect(str(db))
+    old.execute('CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, topic TEXT, payload TEXT)')
+    rows = [('pr/home/room1/temperature', '{"temperature": 21, "humidity": 40}'),
+            ('pr/home/room3/light', '{"Light": "300"}'),
+            ('pr/home/unknown', '{"hum": "45%"}'),
+            ('pr/home/room2/humidity', 'not json')]
+    old.executemany("INSERT INTO messages (ts, topic, payload) VALUES ('2024-01-01T00:00:00', ?, ?)", rows)
+    old.commit()
+    old.close()
+    conn = storage.connect(str(db))
+    storage.ensure_schema(conn)
+    migrated = conn.execute('SELECT message_id, room_id, sensor, value FROM readings ORDER BY id').fetchall()
+    conn.close()
+    live = []
+    for msg_id, (topic, payload) in enumerate(rows, 1):
+        room_name, _sensor_type, _data, values = room_config.parse_message(topic, payload)
+        live += [(msg_id, room_config.get_room_id(room_name), sensor, value) for sensor, value in values.items()]
+    assert migrated == live == [(1, 1, 'temperature', 21.0), (2, 3, 'lux', 300.0), (3, None, 'humidity', 45.0)]
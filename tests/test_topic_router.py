@@ -0,0 +1,58 @@
+from room_config import TopicRouter, build_router
+
+
+def test_exact_topics():
+    router = TopicRouter()
+    router.add('pr/home/room1/temperature', 'Living Room', 'temperature')
+    assert router.route('pr/home/room1/temperature') == ('Living Room', 'temperature')
+    assert router.route('pr/home/room1/humidity') == (None, None)
+
+
+def test_single_level_wildcard_fills_the_captures():
+    router = TopicRouter()
+    router.add('pr/building1/+/+', '{0}', '{1}')
+    assert router.route('pr/building1/lab3/temperature') == ('lab3', 'temperature')
+    assert router.route('pr/building1/lab3') == (None, None)
+    assert router.route('pr/building1/lab3/temperature/raw') == (None, None)
+
+
+def test_multi_level_wildcard():
+    router = TopicRouter()
+    router.add('sim/#', 'sim', '{0}')
+    assert router.route('sim/a/b/c') == ('sim', 'a/b/c')
+    # 'a/#' also matches the parent level itself
+    assert router.route('sim') == ('sim', '')
+    assert router.route('other/a') == (None, None)
+
+
+def test_literal_levels_win_over_wildcards():
+    router = TopicRouter()
+    router.add('pr/+/temperature', 'any', 'temperature')
+    router.add('pr/lab/+', 'lab', '{0}')
+    assert router.route('pr/lab/temperature') == ('lab', 'temperature')
+    assert router.route('pr/office/temperature') == ('any', 'temperature')
+    # exact topics win over every pattern
+    router.add('pr/lab/temperature', 'Lab exact', 'temperature')
+    assert router.route('pr/lab/temperature') == ('Lab exact', 'temperature')
+
+
+def test_cached_misses_are_dropped_when_a_pattern_is_added():
+    router = TopicRouter()
+    assert router.route('x/y') == (None, None)
+    router.add('x/+', 'X', '{0}')
+    assert router.route('x/y') == ('X', 'y')
+
+
+def test_cache_is_bounded():
+    router = TopicRouter(max_cache=3)
+    router.add('t/+', 'T', '{0}')
+    for i in range(10):
+        assert router.route(f't/{i}') == ('T', str(i))
+    assert len(router._cache) <= 3
+
+
+def test_configured_rooms():
+    router = build_router()
+    assert router.route('pr/home/room3/light') == ('Kitchen', 'light')
+    assert router.route('pr/home/room2/all') == ('Bedroom', 'all')
+    assert router.route('pr/home/5976397/sts') == ('Living Room', 'humidity')